@@ -0,0 +1,919 @@
+import argparse
+import asyncio
+import csv
+import importlib.util
+import json
+import os
+import platform
+import queue
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import task_dates
+
+# Word pool used to build synthetic task names and descriptions
+WORDS = ["water", "plant", "dog", "food", "milk", "carton", "med", "report", "email", "call",
+         "invoice", "garden", "clean", "kitchen", "meeting", "review", "budget", "car", "gym", "book"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+
+# Load a stage script (the file names contain spaces, so they can't be imported directly).
+# It is registered in sys.modules so worker processes can unpickle its functions.
+def load_stage(file_name, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, file_name)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+stage1 = load_stage("Stage 1.py", "stage1")
+stage2 = load_stage("Stage 2.py", "stage2")
+stage3 = load_stage("Stage 3.py", "stage3")
+stage4 = load_stage("Stage 4.py", "stage4")
+
+
+# Build a list of random task dictionaries. name_words sets how many words go into each
+# name, priority_weights skews the High/Medium/Low mix, and date_spread_days spreads due
+# dates over that many days from 2024-01-01 (by default they cover 2023-2026).
+def make_task_dicts(count, seed=42, name_words=2, priority_weights=None, date_spread_days=None):
+    rng = random.Random(seed)
+    first_day = stage4.date(2024, 1, 1).toordinal()
+
+    def make_priority():
+        if priority_weights is None:
+            return rng.choice(PRIORITIES)
+        return rng.choices(PRIORITIES, priority_weights)[0]
+
+    def make_due_date():
+        if date_spread_days is None:
+            return f"{rng.randint(2023, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        return stage4.date.fromordinal(first_day + rng.randint(0, date_spread_days)).isoformat()
+
+    return [{
+        "name": " ".join([*(rng.choice(WORDS) for _ in range(name_words)), str(i)]),
+        "description": " ".join(rng.choice(WORDS) for _ in range(4)),
+        "priority": make_priority(),
+        "due_date": make_due_date()
+    } for i in range(count)]
+
+
+# Build a TaskManager holding the given tasks without touching tasks.json (or leaving a lock file behind)
+def make_manager(task_dicts):
+    manager = stage4.TaskManager(json_file=os.path.join(tempfile.gettempdir(), "benchmark-missing.json"), load=False)
+    manager.tasks = [stage4.Task(**data) for data in task_dicts]
+    manager.rebuild_indexes()
+    return manager
+
+
+# Run a function several times and return the best time in milliseconds
+def best_time_ms(function, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+# Read what the GUI shows of a query result: its length and the first screenful of rows
+def read_screenful(tasks, rows=50):
+    return len(tasks), tasks[:rows]
+
+
+# Compare the trigram-indexed name search with the original full scan
+# (the query caches are cleared before every run, so each search is done in full)
+def benchmark_name_search(sizes, search_terms=("kitchen", "budget 12", "wat")):
+    print("Name search: full scan vs trigram index")
+    for size in sizes:
+        manager = make_manager(make_task_dicts(size))
+        for term in search_terms:
+            scan_ms = best_time_ms(lambda: [t for t in manager.tasks if term.lower() in t.name.lower()])
+            index_ms = best_time_ms(lambda: (manager.clear_query_caches(), manager.get_filtered_tasks(term)))
+            print(f"  {size:>9} tasks  {term!r:<12} scan {scan_ms:9.2f} ms  index {index_ms:9.2f} ms")
+
+
+# Minimal stand-in for ttk.Treeview so rendering can be timed without a display
+class FakeTreeview:
+    def __init__(self):
+        self.items = {}  # item id -> values, kept in display order
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def delete(self, *items):
+        for item in items:
+            del self.items[item]
+
+    def insert(self, parent, index, iid, values):
+        order = list(self.items.items())
+        order.insert(index, (iid, values))
+        self.items = dict(order)
+
+    def move(self, item, parent, index):
+        values = self.items.pop(item)
+        self.insert(parent, index, item, values)
+
+    def item(self, item, values):
+        self.items[item] = values
+
+    def yview(self, *args):
+        pass
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+# Stand-in for the scrollbar
+class FakeScrollbar:
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+# Stand-in for the status label
+class FakeLabel:
+    def config(self, text):
+        self.text = text
+
+
+# Stand-in for the Tk root that runs root.after callbacks when asked to
+class FakeRoot:
+    def __init__(self):
+        self.jobs = {}
+        self.next_job = 0
+
+    def after(self, delay_ms, callback, *args):
+        self.next_job += 1
+        self.jobs[self.next_job] = (callback, args)
+        return self.next_job
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_pending(self):
+        while self.jobs:
+            job = min(self.jobs)
+            callback, args = self.jobs.pop(job)
+            callback(*args)
+
+
+# Build a TaskManagerGUI wired to fake widgets
+def make_headless_gui(manager):
+    gui = stage4.TaskManagerGUI.__new__(stage4.TaskManagerGUI)
+    gui.root = FakeRoot()
+    gui.task_manager = manager
+    gui.load_queue = queue.Queue()
+    gui.sort_key = None
+    gui.sort_reverse = False
+    gui.query_worker = stage4.QueryWorker(gui.root)
+    gui.init_table_state()
+    gui.tree = FakeTreeview()
+    gui.scrollbar = FakeScrollbar()
+    gui.status_label = FakeLabel()
+    return gui
+
+
+# Time the slowest render step for populating, sorting and scrolling a large table
+def benchmark_render(size=100_000, scroll_steps=200):
+    print(f"Table rendering at {size} rows (frame budget {stage4.FRAME_BUDGET_MS} ms)")
+    gui = make_headless_gui(make_manager(make_task_dicts(size)))
+    timings = {}
+    gui.populate_tree()
+    timings["populate"] = gui.last_render_ms
+    gui.sort_by_name()
+    gui.root.run_pending()  # Wait for the query worker
+    timings["sort"] = gui.last_render_ms
+    worst_scroll = 0.0
+    for step in range(scroll_steps):
+        gui.scroll_to(gui.first_row + 3)
+        worst_scroll = max(worst_scroll, gui.last_render_ms)
+    timings["scroll"] = worst_scroll
+    gui.scroll_to(size // 2)
+    timings["jump"] = gui.last_render_ms
+    for name, ms in timings.items():
+        verdict = "ok" if ms <= stage4.FRAME_BUDGET_MS else "OVER BUDGET"
+        print(f"  {name:<9} {ms:7.2f} ms  {verdict}")
+    return all(ms <= stage4.FRAME_BUDGET_MS for ms in timings.values())
+
+
+# Close Stage 3's journal and lock files and forget what it read, before leaving a work directory
+def reset_stage3():
+    for name in ("journal_file", "lock_file"):
+        file = getattr(stage3, name)
+        if file is not None:
+            file.close()
+            setattr(stage3, name, None)
+    stage3.snapshot_signature = None
+    stage3.journal_offset = 0
+    stage3.tasks.clear()
+
+
+# Call one of the interactive CLI functions with scripted answers and silenced output
+def run_with_answers(module, function, answers):
+    replies = iter(answers)
+    module.input = lambda prompt="": next(replies)
+    module.print = lambda *args, **kwargs: None
+    try:
+        function()
+    finally:
+        del module.input, module.print
+
+
+# Time the CLI name lookups (duplicate check, update, delete) against the old list scans
+def benchmark_name_lookup(sizes, operations=200):
+    print("CLI name lookups per operation: list scan (before) vs keyed dict")
+    original_dir = os.getcwd()
+    for size in sizes:
+        task_dicts = make_task_dicts(size)
+        old_tasks = [[d["name"], d["description"], d["priority"], d["due_date"]] for d in task_dicts]
+        names = [d["name"] for d in random.Random(7).sample(task_dicts, operations)]
+
+        def old_operations():
+            for name in names:
+                any(task[0].lower() == name.lower() for task in old_tasks)  # Duplicate check
+                next(task for task in old_tasks if task[0] == name)  # Update lookup
+            for name in names:
+                index = next(i for i, task in enumerate(old_tasks) if task[0] == name)
+                old_tasks.append(old_tasks.pop(index))  # Delete, then put it back for the next run
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                for label, module in (("Stage 1", stage1), ("Stage 2", stage2), ("Stage 3", stage3)):
+                    module.tasks.clear()
+                    for d in task_dicts:
+                        task = d if module is stage3 else [d["name"], d["description"], d["priority"], d["due_date"]]
+                        module.tasks[d["name"].lower()] = task
+
+                    def new_operations():
+                        for name in names:
+                            run_with_answers(module, module.add_task, [name.upper()])  # Rejected as a duplicate
+                            run_with_answers(module, module.update_task, [name, "", "", ""])
+                        for name in names:
+                            task = module.tasks[name.lower()]
+                            run_with_answers(module, module.delete_task, [name])
+                            module.tasks[name.lower()] = task
+
+                    new_ms = best_time_ms(new_operations, repeat=3) / (3 * operations)
+                    print(f"  {size:>9} tasks  {label}  keyed dict {new_ms * 1000:8.2f} us")
+                    module.tasks.clear()
+                reset_stage3()
+            finally:
+                os.chdir(original_dir)
+        old_ms = best_time_ms(old_operations, repeat=3) / (3 * operations)
+        print(f"  {size:>9} tasks  list scan (before)  {old_ms * 1000:8.2f} us")
+
+
+# Measure bulk import throughput from CSV and JSON Lines files
+def benchmark_import(sizes):
+    print("Bulk import throughput")
+    original_dir = os.getcwd()
+    for size in sizes:
+        task_dicts = make_task_dicts(size)
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                with open("tasks.csv", "w", newline="") as file:
+                    writer = csv.DictWriter(file, fieldnames=stage3.TASK_FIELDS)
+                    writer.writeheader()
+                    writer.writerows(task_dicts)
+                with open("tasks.jsonl", "w") as file:
+                    file.writelines(json.dumps(task) + "\n" for task in task_dicts)
+                for source in ("tasks.csv", "tasks.jsonl"):
+                    stage3.tasks.clear()
+                    start = time.perf_counter()
+                    imported, rejected = stage3.import_tasks(stage3.read_task_records(source))
+                    elapsed = time.perf_counter() - start
+                    print(f"  {size:>9} tasks  {source:<12} {imported / elapsed:10.0f} tasks/s  ({rejected} rejected)")
+            finally:
+                reset_stage3()
+                os.chdir(original_dir)
+
+
+# Compare the per-mutation cost of a full tasks.json rewrite with a journal append
+def benchmark_journal(sizes, mutations=200):
+    print("Persisting one change: full rewrite vs journal append")
+    original_dir = os.getcwd()
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                stage3.tasks.update((data["name"].lower(), data) for data in make_task_dicts(size))
+                task = next(iter(stage3.tasks.values()))
+                rewrite_ms = best_time_ms(stage3.compact_journal, repeat=3)
+                start = time.perf_counter()
+                for _ in range(mutations):
+                    stage3.append_to_journal({"op": "update", "task": task})
+                stage3.sync_journal()
+                append_ms = (time.perf_counter() - start) * 1000 / mutations
+                stage3.compact_journal()
+            finally:
+                reset_stage3()
+                os.chdir(original_dir)
+        print(f"  {size:>9} tasks  rewrite {rewrite_ms:9.2f} ms  journal {append_ms:7.3f} ms")
+
+
+# The Task class as it was before __slots__, for memory comparisons
+class DictTask:
+    def __init__(self, name, description, priority, due_date):
+        self.name = name
+        self.description = description
+        self.priority = priority
+        self.due_date = due_date
+
+
+# Measure the bytes allocated per task by each in-memory representation
+def benchmark_memory(size=100_000):
+    print(f"Memory per task at {size} tasks")
+    # Each build parses fresh JSON so the strings count towards the representation
+    text = json.dumps(make_task_dicts(size))
+    builders = {
+        "dict-based Task (before)": lambda: [DictTask(**data) for data in json.loads(text)],
+        "__slots__ Task with sort keys": lambda: [stage4.Task(**data) for data in json.loads(text)],
+        "columnar TaskStore": lambda: stage4.TaskStore(stage4.Task(**data) for data in json.loads(text)),
+    }
+    for label, build in builders.items():
+        tracemalloc.start()
+        tasks = build()
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"  {label:<30} {allocated / size:8.1f} bytes")
+        del tasks
+
+
+# Measure what keeping old versions of the task list alive costs: each version is kept after
+# one change (add, update or delete), either as the manager's copy-on-write TaskVector or as a
+# full copy of a plain list, which is what a reader would need without structural sharing
+def benchmark_versions(size=100_000, versions=200):
+    print(f"Memory per retained version at {size} tasks ({versions} versions)")
+    task_dicts = make_task_dicts(size + versions)
+    snapshots = {"copy-on-write TaskVector": lambda manager: manager.get_version()[1],
+                 "full list copy (before)": lambda manager: list(manager.tasks)}
+    for label, take_snapshot in snapshots.items():
+        manager = make_manager(task_dicts[:size])
+        rng = random.Random(1)
+        kept = []
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(versions):
+            task = manager.tasks[rng.randrange(len(manager.tasks))]
+            if i % 3 == 0:
+                manager.add_task(stage4.Task(**task_dicts[size + i]))
+            elif i % 3 == 1:
+                manager.update_task(task, priority=rng.choice(PRIORITIES))
+            else:
+                manager.delete_task(task)
+            kept.append(take_snapshot(manager))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"  {label:<26} {allocated / versions / 1024:9.1f} KiB per version"
+              f"  {elapsed_ms / versions:7.3f} ms per change")
+        del kept
+
+
+# Compare reading tasks.json with mapping a binary snapshot of the same tasks
+def benchmark_snapshot(size=100_000):
+    print(f"tasks.json vs binary snapshot at {size} tasks")
+    tasks = [stage4.Task(**data) for data in make_task_dicts(size)]
+    with tempfile.TemporaryDirectory() as work_dir:
+        json_file = os.path.join(work_dir, "tasks.json")
+        snapshot_file = os.path.join(work_dir, "tasks.snap")
+        with open(json_file, "w") as file:
+            stage4.write_tasks_json(tasks, file)
+        stage4.write_snapshot(tasks, snapshot_file)
+
+        def read_json():
+            return list(stage4.iter_tasks_from_json(json_file))
+
+        def read_snapshot():
+            with stage4.TaskSnapshot(snapshot_file) as snapshot:
+                return [view.to_task() for view in snapshot]
+
+        def open_and_read_one():
+            with stage4.TaskSnapshot(snapshot_file) as snapshot:
+                return snapshot[size // 2].to_dict()
+
+        print(f"  file size         json {os.path.getsize(json_file) / 1e6:7.1f} MB"
+              f"  snapshot {os.path.getsize(snapshot_file) / 1e6:7.1f} MB")
+        print(f"  read every task   json {best_time_ms(read_json, 1):9.1f} ms  snapshot {best_time_ms(read_snapshot, 1):9.1f} ms")
+        print(f"  open, read one    snapshot {best_time_ms(open_and_read_one):7.3f} ms")
+
+
+# Compare filtering and sorting in memory with the SQLite backend
+# (the in-memory query caches are cleared before every run)
+def benchmark_sqlite(sizes):
+    print("Filtering and sorting: in memory vs SQLite")
+    queries = {"name 'budget 12'": ("budget 12", None, None), "priority High": (None, "High", None),
+               "High + 2024-03-03": (None, "High", "2024-03-03")}
+    for size in sizes:
+        task_dicts = make_task_dicts(size)
+        memory_manager = make_manager(task_dicts)
+        with tempfile.TemporaryDirectory() as work_dir:
+            sqlite_manager = stage4.SqliteTaskManager(os.path.join(work_dir, "tasks.db"))
+            sqlite_manager.add_tasks([stage4.Task(**data) for data in task_dicts])
+            for label, query in queries.items():
+                # SQLite results are lazy, so both sides time what the GUI reads: the count and a screenful
+                memory_ms = best_time_ms(lambda: (memory_manager.clear_query_caches(),
+                                                  read_screenful(memory_manager.get_filtered_tasks(*query))))
+                sqlite_ms = best_time_ms(lambda: read_screenful(sqlite_manager.get_filtered_tasks(*query)))
+                print(f"  {size:>9} tasks  {label:<20} memory {memory_ms:9.2f} ms  sqlite {sqlite_ms:9.2f} ms")
+            # The GUI reads one screenful of a sorted view
+            memory_ms = best_time_ms(lambda: (memory_manager.clear_query_caches(),
+                                              memory_manager.sort_tasks("due_date", True)[:50]))
+            sqlite_ms = best_time_ms(lambda: sqlite_manager.sort_tasks("due_date", True)[:50])
+            print(f"  {size:>9} tasks  {'first 50 by date':<20} memory {memory_ms:9.2f} ms  sqlite {sqlite_ms:9.2f} ms")
+            sqlite_manager.close()
+
+
+# Compare sorting a whole query result and slicing it with fetching just one page
+def benchmark_pagination(sizes, page_size=50):
+    print(f"First {page_size} rows of a sorted query: full sort + slice vs get_task_page")
+    queries = {"all, by date desc": ((None, None, None), "due_date", True),
+               "High, by name": ((None, "High", None), "name", False),
+               "all, priority+date": ((None, None, None), ("priority", "due_date"), False)}
+    for size in sizes:
+        manager = make_manager(make_task_dicts(size))
+        for label, (query, sort_key, reverse) in queries.items():
+            filtered = manager.get_filtered_tasks(*query)
+            full_ms = best_time_ms(lambda: manager.sort_task_list(filtered, sort_key, reverse)[:page_size])
+            page_ms = best_time_ms(lambda: manager.get_task_page(*query, sort_key=sort_key, reverse=reverse,
+                                                                 limit=page_size))
+            print(f"  {size:>9} tasks  {label:<20} full sort {full_ms:9.2f} ms  page {page_ms:7.2f} ms")
+        # A page deep into the name order, reached by cursor instead of offset
+        cursor = manager.get_task_page(sort_key="name", limit=size // 2).next_cursor
+        offset_ms = best_time_ms(lambda: manager.get_task_page(sort_key="name", limit=page_size, offset=size // 2))
+        cursor_ms = best_time_ms(lambda: manager.get_task_page(sort_key="name", limit=page_size, cursor=cursor))
+        print(f"  {size:>9} tasks  {'middle page by name':<20} offset {offset_ms:12.2f} ms  cursor {cursor_ms:5.2f} ms")
+
+
+# Compare handing changes downstream as a full rewrite of tasks.json with a delta export of
+# the tasks changed since the last sync, with the peak memory each allocates
+def benchmark_change_export(sizes, edits=1000):
+    print(f"Syncing {edits} edits downstream: full tasks.json rewrite vs export_changes")
+    with tempfile.TemporaryDirectory() as work_dir:
+        target = os.path.join(work_dir, "out")
+        for size in sizes:
+            manager = make_manager(make_task_dicts(size))
+            since = manager.change_seq
+            rng = random.Random(5)
+            for _ in range(edits):
+                manager.update_task(manager.tasks[rng.randrange(size)], priority=rng.choice(PRIORITIES))
+
+            def export(file_format):
+                with open(target, "w", newline="") as file:
+                    manager.export_changes(file, since, file_format)
+
+            timings = {}
+            for label, run in (("rewrite", lambda: manager.save_tasks_to_json(target)),
+                               ("jsonl", lambda: export("jsonl")), ("csv", lambda: export("csv"))):
+                tracemalloc.start()
+                run()
+                peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+                tracemalloc.stop()
+                timings[label] = (best_time_ms(run, repeat=3), peak_kb, os.path.getsize(target) / 1024)
+            print(f"  {size:>9} tasks  " + "  ".join(f"{label} {ms:8.1f} ms {kb:6.0f} KB written ({peak:.0f} KB peak)"
+                                                     for label, (ms, peak, kb) in timings.items()))
+
+
+# Compare due date parsing with strptime (before) and the shared task_dates parser, both on
+# the few thousand distinct dates real task lists repeat and on all-distinct dates
+def benchmark_dates(count=1_000_000):
+    print(f"Parsing {count} due dates: strptime vs task_dates")
+    first_day = datetime(1900, 1, 1).toordinal()
+    inputs = {"repeated dates": [data["due_date"] for data in make_task_dicts(count // 10)] * 10,
+              "distinct dates": [task_dates.format_date_ordinal(first_day + i) for i in range(count)]}
+
+    def with_strptime(dates):
+        for due_date in dates:
+            datetime.strptime(due_date, "%Y-%m-%d").toordinal()
+
+    def with_task_dates(dates):
+        task_dates.parse_date_ordinal.cache_clear()
+        get_date_ordinal = task_dates.get_date_ordinal
+        for due_date in dates:
+            get_date_ordinal(due_date)
+
+    for label, dates in inputs.items():
+        before_ms = best_time_ms(lambda: with_strptime(dates), repeat=1)
+        after_ms = best_time_ms(lambda: with_task_dates(dates), repeat=3)
+        print(f"  {label:<15} strptime {before_ms / count * 1e6:7.0f} ns/date  "
+              f"task_dates {after_ms / count * 1e6:5.0f} ns/date  ({before_ms / after_ms:.1f}x)")
+
+
+# Compare finding the most urgent tasks by re-sorting everything after each edit with the urgency queue
+def benchmark_next_tasks(sizes, edits=200):
+    print(f"Next {stage4.NEXT_TASK_COUNT} tasks after each edit: full re-sort vs urgency queue ({edits} edits)")
+    today = stage4.date(2025, 6, 1)
+    for size in sizes:
+        manager = make_manager(make_task_dicts(size))
+        rng = random.Random(7)
+        edited = [(rng.randrange(size), rng.choice(PRIORITIES)) for _ in range(edits)]
+        ordinal = today.toordinal()
+        key = lambda task: (stage4.get_urgency_key(task, ordinal), task.seq)
+
+        def resort():
+            for index, priority in edited:
+                manager.update_task(manager.tasks[index], priority=priority)
+                sorted(manager.tasks, key=key)[:stage4.NEXT_TASK_COUNT]
+
+        def with_queue():
+            for index, priority in edited:
+                manager.update_task(manager.tasks[index], priority=priority)
+                manager.get_next_tasks(stage4.NEXT_TASK_COUNT, today)
+
+        resort_ms = best_time_ms(resort, repeat=1) / edits
+        build_ms = best_time_ms(lambda: stage4.UrgencyQueue(manager.tasks, ordinal), repeat=3)
+        queue_ms = best_time_ms(with_queue, repeat=3) / edits
+        new_day_ms = best_time_ms(lambda: (manager.get_urgency_queue(stage4.date(2025, 6, 2)),
+                                           manager.get_urgency_queue(today)), repeat=3) / 2
+        print(f"  {size:>9} tasks  re-sort {resort_ms:9.2f} ms/edit  queue {queue_ms:6.3f} ms/edit"
+              f"  (built in {build_ms:7.1f} ms, next day {new_day_ms:6.1f} ms)")
+
+
+# Write a tasks.json of roughly the given size in megabytes and return the task count
+def write_tasks_file(path, size_mb):
+    count = 0
+    with open(path, "w") as file:
+        file.write("[")
+        while file.tell() < size_mb * 1024 * 1024:
+            batch = make_task_dicts(10_000, seed=count)
+            file.write(("," if count else "") + ",".join(json.dumps(task, indent=4) for task in batch))
+            count += len(batch)
+        file.write("]")
+    return count
+
+
+# The Stage 2 loader before quoting support: split every line on commas
+def load_txt_by_splitting(path):
+    tasks = {}
+    with open(path) as file:
+        for line in file:
+            parts = line.strip().split(",")
+            if len(parts) == 4:
+                name, description, priority, due_date = parts
+                tasks.setdefault(name.lower(), [name, description, priority, due_date])
+            # (it printed a message for every other line, which isn't timed here)
+    return tasks
+
+
+# Load tasks.txt with the Stage 2 loader, silenced, using the given number of worker processes
+def load_txt_with_stage2(path, workers):
+    stage2.tasks.clear()
+    stage2.print = lambda *args, **kwargs: None
+    try:
+        stage2.load_tasks_from_file(path, workers)
+    finally:
+        del stage2.print
+    return stage2.tasks
+
+
+# Compare the old comma-splitting tasks.txt loader with the CSV parser, in one process and in parallel
+def benchmark_txt_load(size_mb=200, comma_share=0.2):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "tasks.txt")
+        count = 0
+        rng = random.Random(3)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            while file.tell() < size_mb * 1024 * 1024:
+                for data in make_task_dicts(10_000, seed=count):
+                    description = data["description"]
+                    if rng.random() < comma_share:
+                        description = description.replace(" ", ", ", 1)  # Written quoted
+                    writer.writerow([data["name"], description, data["priority"], data["due_date"]])
+                count += 10_000
+        print(f"Loading a {size_mb} MB tasks.txt ({count} tasks, {comma_share:.0%} with a comma in the description,"
+              f" {os.cpu_count()} CPUs)")
+        loaders = {"split on commas (before)": lambda: load_txt_by_splitting(path),
+                   "csv parser, 1 process": lambda: load_txt_with_stage2(path, 1),
+                   f"csv parser, {os.cpu_count()} processes": lambda: load_txt_with_stage2(path, None)}
+        for label, load in loaders.items():
+            start = time.perf_counter()
+            loaded = len(load())
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<26} {size_mb / elapsed:7.1f} MB/s  {loaded / elapsed:9.0f} tasks/s  ({loaded} loaded)")
+        stage2.tasks.clear()
+
+
+# Load a tasks file in this process and print time-to-first-row, total time and peak RSS
+def probe_load(mode, path):
+    start = time.perf_counter()
+    first_row = None
+    if mode == "json.load":
+        with open(path) as file:
+            tasks = [stage4.Task(**task) for task in json.load(file)]
+        first_row = time.perf_counter() - start
+    else:
+        tasks = []
+        for task in stage4.iter_tasks_from_json(path):
+            if first_row is None:
+                first_row = time.perf_counter() - start
+                if mode == "stream-first-page":
+                    break
+            tasks.append(task)
+    total = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"first_row_s": first_row, "total_s": total, "peak_rss_mb": peak_mb}))
+
+
+# Compare the old json.load startup with the streaming loader, each in a fresh process
+def benchmark_streaming_load(size_mb=500):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "tasks.json")
+        count = write_tasks_file(path, size_mb)
+        print(f"Loading a {size_mb} MB tasks.json ({count} tasks)")
+        for mode in ("json.load", "stream-all", "stream-first-page"):
+            output = subprocess.run([sys.executable, __file__, "--probe-load", mode, path],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            print(f"  {mode:<18} first row {result['first_row_s']:8.3f} s  total {result['total_s']:8.3f} s"
+                  f"  peak RSS {result['peak_rss_mb']:8.1f} MB")
+
+
+# Python code that imports Stage 4 the way the benchmarks and the task service do
+IMPORT_STAGE4 = ("import importlib.util; "
+                 f"spec = importlib.util.spec_from_file_location('stage4', {os.path.abspath('Stage 4.py')!r}); "
+                 "spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+
+
+# Get the median wall-clock time of running a command to completion
+def median_run_ms(command, repeat=7, cwd=None):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+# Measure startup: what importing Stage 4 costs (-X importtime and wall clock), reading tasks from
+# tasks.json vs the GUI's snapshot cache, and the GUI's time to interactive with and without --fast-start
+def benchmark_startup(size=100_000, slowest=5):
+    print(f"Startup at {size} tasks")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_STAGE4], cwd=os.getcwd(),
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines()[1:]:
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        imports.append((int(self_us), int(cumulative_us), name.rstrip()))
+    top_level = sorted((entry for entry in imports if not entry[2].startswith("  ")), key=lambda entry: -entry[1])
+    print(f"  -X importtime     {sum(entry[0] for entry in imports) / 1000:6.1f} ms in {len(imports)} modules, slowest: "
+          + ", ".join(f"{name.strip()} {cumulative / 1000:.1f}" for _, cumulative, name in top_level[:slowest]))
+    bare_ms = median_run_ms([sys.executable, "-c", "pass"])
+    import_ms = median_run_ms([sys.executable, "-c", IMPORT_STAGE4])
+    print(f"  wall clock        python {bare_ms:6.1f} ms  + import Stage 4 {import_ms - bare_ms:6.1f} ms")
+
+    tasks = [stage4.Task(**data) for data in make_task_dicts(size)]
+    with tempfile.TemporaryDirectory() as work_dir:
+        json_file = os.path.join(work_dir, "tasks.json")
+        with open(json_file, "w") as file:
+            stage4.write_tasks_json(tasks, file)
+        cache_file = stage4.get_snapshot_cache_file(json_file)
+        stage4.write_snapshot_cache(tasks, cache_file, stage4.get_file_signature(json_file))
+
+        def read_cache():
+            with stage4.TaskSnapshot(cache_file) as snapshot:
+                return list(snapshot.iter_tasks())
+
+        json_ms = best_time_ms(lambda: list(stage4.iter_tasks_from_json(json_file)), 1)
+        print(f"  read every task   json {json_ms:9.1f} ms  snapshot cache {best_time_ms(read_cache, 1):9.1f} ms")
+
+        os.remove(cache_file)  # The first --fast-start run writes it again
+        for label, flags in (("json", []), ("cache miss", ["--fast-start"]), ("cache hit", ["--fast-start"])):
+            start = time.time()
+            result = subprocess.run([sys.executable, os.path.abspath("Stage 4.py"), "--startup-report", *flags],
+                                    cwd=work_dir, capture_output=True, text=True)
+            if result.returncode != 0:
+                error = result.stderr.strip().splitlines() or ["no output"]
+                print(f"  time to interactive skipped ({error[-1]})")
+                return
+            report = json.loads(result.stdout.splitlines()[-1])
+            print(f"  {label:<17} interactive {(report['interactive'] - start) * 1000:7.1f} ms"
+                  f"  first rows {(report['first_rows'] - start) * 1000:7.1f} ms"
+                  f"  loaded {(report['loaded'] - start) * 1000:7.1f} ms")
+
+
+# Time the core TaskManager operations and a headless populate_tree on one synthetic store.
+# Filters and sorts are timed cold, with the query caches cleared before every run.
+def run_suite(size, seed=42, name_words=2, priority_weights=None, date_spread_days=None, repeat=5):
+    task_dicts = make_task_dicts(size, seed, name_words, priority_weights, date_spread_days)
+    timings = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        json_file = os.path.join(work_dir, "tasks.json")
+        with open(json_file, "w") as file:
+            json.dump(task_dicts, file, indent=4)
+        timings["load_json"] = best_time_ms(lambda: stage4.TaskManager(json_file), repeat=min(repeat, 3))
+        manager = stage4.TaskManager(json_file)
+        sample = task_dicts[size // 2]
+        queries = {
+            "filter_name": (sample["name"].split()[0], None, None),
+            "filter_priority": (None, "High", None),
+            "filter_date": (None, None, sample["due_date"]),
+            "filter_combined": (sample["name"].split()[0], "High", sample["due_date"]),
+            "filter_range": (None, None, None, ("2024-03-01", "2024-03-31")),
+        }
+        for label, query in queries.items():
+            timings[label] = best_time_ms(lambda: (manager.clear_query_caches(), manager.get_filtered_tasks(*query)), repeat)
+        for key in ("name", "priority", "due_date"):
+            timings[f"sort_{key}"] = best_time_ms(lambda: (manager.clear_query_caches(), manager.sort_tasks(key)), repeat)
+        timings["page_first_50"] = best_time_ms(
+            lambda: (manager.clear_query_caches(), manager.get_task_page(None, "High", sort_key="due_date", limit=50)), repeat)
+        timings["save_json"] = best_time_ms(lambda: manager.save_tasks_to_json(json_file), repeat=min(repeat, 3))
+
+        def populate():
+            gui = make_headless_gui(manager)
+            gui.populate_tree(manager.tasks)
+            gui.root.run_pending()
+
+        timings["populate_tree"] = best_time_ms(populate, repeat)
+    return {
+        "config": {"size": size, "seed": seed, "name_words": name_words, "priority_weights": priority_weights,
+                   "date_spread_days": date_spread_days, "repeat": repeat},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "timings_ms": {label: round(ms, 3) for label, ms in timings.items()},
+    }
+
+
+# List the timings that got slower than the baseline by more than the threshold (0.2 = 20%)
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for label, baseline_ms in baseline["timings_ms"].items():
+        ms = results["timings_ms"].get(label)
+        if ms is not None and ms > baseline_ms * (1 + threshold):
+            regressions.append(f"{label}: {baseline_ms:.3f} ms -> {ms:.3f} ms")
+    return regressions
+
+
+# Run the suite from the command line, print (and optionally save) the JSON results,
+# and return 1 when a timing regressed past the threshold against a baseline file
+def run_suite_command(argv):
+    parser = argparse.ArgumentParser(prog="Benchmark.py --suite", description="Run the reproducible benchmark suite.")
+    parser.add_argument("--size", type=int, default=100_000, help="number of synthetic tasks")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--name-words", type=int, default=2, help="words in each task name")
+    parser.add_argument("--priority-weights", type=lambda text: [float(w) for w in text.split(",")],
+                        help="High,Medium,Low weights, e.g. 1,3,6")
+    parser.add_argument("--date-spread-days", type=int, help="spread due dates over this many days")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per timing (the best is kept)")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+    results = run_suite(args.size, args.seed, args.name_words, args.priority_weights,
+                        args.date_spread_days, args.repeat)
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["config"] != results["config"]:
+            print("Warning: the baseline was run with a different configuration.", file=sys.stderr)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+# Minimal keep-alive HTTP/1.1 JSON client for load testing the task service
+class ServiceClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    # Send one request and return (status, decoded JSON or None)
+    async def request(self, method, path, payload=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n\r\n"
+                          .encode() + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode().partition(":")
+            if key.lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else None
+
+    def close(self):
+        self.writer.close()
+
+
+# Drive the service with concurrent clients doing a mix of paged listings, filtered and
+# sorted queries, lookups, updates and adds. Returns per-request latencies in ms and errors.
+async def drive_service(host, port, names, clients, requests_per_client, write_ratio, seed=7):
+    latencies = []
+    errors = 0
+
+    async def run_client(client_id):
+        nonlocal errors
+        rng = random.Random(seed + client_id)
+        client = ServiceClient(host, port)
+        await client.connect()
+        try:
+            for step in range(requests_per_client):
+                if rng.random() < write_ratio:
+                    if rng.random() < 0.5:
+                        request = ("PATCH", f"/tasks/{rng.choice(names)}", {"priority": rng.choice(PRIORITIES)})
+                    else:
+                        request = ("POST", "/tasks", {"name": f"load {client_id} {step}", "description": "",
+                                                      "priority": rng.choice(PRIORITIES), "due_date": "2025-06-01"})
+                else:
+                    request = rng.choice([
+                        ("GET", f"/tasks?offset={rng.randrange(0, len(names), 50)}&limit=50", None),
+                        ("GET", f"/tasks?name={rng.choice(WORDS)}&priority={rng.choice(PRIORITIES)}&limit=20", None),
+                        ("GET", f"/tasks?sort={rng.choice(['name', 'priority', 'due_date'])}&limit=50", None),
+                        ("GET", f"/tasks/{rng.choice(names)}", None),
+                    ])
+                request = (request[0], request[1].replace(" ", "%20"), request[2])
+                start = time.perf_counter()
+                status, _ = await client.request(*request)
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += status >= 400
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(i) for i in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+# Load test the task service at url, or start a local instance over a synthetic store,
+# and report requests per second and tail latency
+def benchmark_service(url=None, size=10_000, clients=32, requests_per_client=200, write_ratio=0.1):
+    task_dicts = make_task_dicts(size)
+    names = [task["name"] for task in task_dicts]
+    with tempfile.TemporaryDirectory() as work_dir:
+        server = None
+        if url is None:
+            json_file = os.path.join(work_dir, "tasks.json")
+            with open(json_file, "w") as file:
+                json.dump(task_dicts, file)
+            server = subprocess.Popen([sys.executable, "Task Service.py", "--tasks", json_file, "--port", "0"],
+                                      stdout=subprocess.PIPE, text=True)
+            url = server.stdout.readline().split()[-1]
+        address = urlsplit(url)
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                drive_service(address.hostname, address.port, names, clients, requests_per_client, write_ratio))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[max(0, -(-len(latencies) * p // 100) - 1)]
+
+    print(f"Task service load test: {clients} clients x {requests_per_client} requests, "
+          f"{write_ratio:.0%} writes, {size} tasks")
+    print(f"  throughput  {len(latencies) / elapsed:9.0f} requests/s  ({errors} errors)")
+    print(f"  latency     p50 {percentile(50):7.2f} ms  p95 {percentile(95):7.2f} ms  p99 {percentile(99):7.2f} ms"
+          f"  max {latencies[-1]:7.2f} ms")
+    return errors == 0
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--probe-load"]:
+    probe_load(sys.argv[2], sys.argv[3])
+elif __name__ == "__main__" and sys.argv[1:2] == ["--suite"]:
+    sys.exit(run_suite_command(sys.argv[2:]))
+elif __name__ == "__main__" and sys.argv[1:2] == ["--load-test"]:
+    # python Benchmark.py --load-test [URL]  (without a URL a local service is started)
+    sys.exit(0 if benchmark_service(*sys.argv[2:3]) else 1)
+elif __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    benchmark_name_search(sizes)
+    benchmark_journal(sizes)
+    benchmark_name_lookup(sizes)
+    benchmark_import(sizes)
+    benchmark_memory()
+    benchmark_versions()
+    benchmark_snapshot()
+    benchmark_sqlite(sizes)
+    benchmark_pagination(sizes)
+    benchmark_next_tasks(sizes)
+    benchmark_dates()
+    benchmark_change_export(sizes)
+    benchmark_streaming_load()
+    benchmark_startup()
+    benchmark_txt_load()
+    if not benchmark_render():
+        sys.exit(1)
@@ -0,0 +1,132 @@
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PRIORITIES = ["High", "Medium", "Low"]
+RESULT_TIMEOUT_SECONDS = 300  # Give up if a process dies without reporting
+
+
+# Load a stage script (the file names contain spaces, so they can't be imported directly)
+def load_stage(file_name, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(PACKAGE_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Run one Stage 3 scripted command with its output silenced and return the exit code
+def run_quietly(stage3, arguments):
+    with redirect_stdout(io.StringIO()):
+        return stage3.run_command(arguments)
+
+
+# Writer process: adds, updates and deletes its own tasks through Stage 3's scripted commands,
+# all in one process so it keeps catching up with the others incrementally. Reports the
+# tasks it expects to survive.
+def run_writer(work_dir, worker, operations, results):
+    os.chdir(work_dir)
+    stage3 = load_stage("Stage 3.py", f"stage3_worker{worker}")
+    rng = random.Random(worker)
+    expected = {}
+    failures = 0
+    for step in range(operations):
+        choice = rng.random()
+        if not expected or choice < 0.4:
+            task = {"name": f"w{worker}-{step}", "description": f"from worker {worker}",
+                    "priority": rng.choice(PRIORITIES), "due_date": f"2025-{rng.randint(1, 12):02d}-15"}
+            code = run_quietly(stage3, ["add", task["name"], "--description", task["description"],
+                                        "--priority", task["priority"], "--due-date", task["due_date"]])
+            if code == 0:
+                expected[task["name"]] = task
+        elif choice < 0.75:
+            name = rng.choice(sorted(expected))
+            priority = rng.choice(PRIORITIES)
+            code = run_quietly(stage3, ["update", name, "--priority", priority])
+            if code == 0:
+                expected[name]["priority"] = priority
+        elif choice < 0.9:
+            name = rng.choice(sorted(expected))
+            code = run_quietly(stage3, ["delete", name])
+            if code == 0:
+                del expected[name]
+        else:
+            code = run_quietly(stage3, ["list"])
+        failures += code != 0
+    stage3.sync_journal()
+    results.put(("writer", worker, expected, failures))
+
+
+# Reader process: keeps a Stage 4 TaskManager in step with the writers until told to stop
+def run_reader(work_dir, stop, results):
+    os.chdir(work_dir)
+    stage4 = load_stage("Stage 4.py", "stage4_reader")
+    manager = stage4.TaskManager("tasks.json")
+    reloads = deltas = 0
+    while not stop.is_set():
+        signature = manager.file_signature
+        if manager.refresh_if_changed():
+            if manager.file_signature != signature:
+                reloads += 1
+            else:
+                deltas += 1
+    manager.refresh_if_changed()
+    tasks = {task.name: task.to_dict() for task in manager.tasks}
+    results.put(("reader", reloads, deltas, tasks))
+
+
+# Run N writer processes and one reader against one store, then check nothing was lost
+def run_stress_test(workers=4, operations=60):
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        reader = multiprocessing.Process(target=run_reader, args=(work_dir, stop, results))
+        reader.start()
+        writers = [multiprocessing.Process(target=run_writer, args=(work_dir, worker, operations, results))
+                   for worker in range(workers)]
+        for writer in writers:
+            writer.start()
+        # Collect results before joining so no process blocks on a full queue
+        reports = [results.get(timeout=RESULT_TIMEOUT_SECONDS) for _ in writers]
+        for writer in writers:
+            writer.join()
+        stop.set()
+        reader_report = results.get(timeout=RESULT_TIMEOUT_SECONDS)
+        reader.join()
+
+        expected = {}
+        failures = 0
+        for _, worker, worker_tasks, worker_failures in reports:
+            expected.update(worker_tasks)
+            failures += worker_failures
+
+        # A fresh process reading the store from disk must see exactly the expected tasks
+        os.chdir(work_dir)
+        try:
+            stage3 = load_stage("Stage 3.py", "stage3_check")
+            run_quietly(stage3, ["export", "final.jsonl", "--format", "jsonl"])
+            with open("final.jsonl") as file:
+                on_disk = {task["name"]: task for task in map(json.loads, file)}
+        finally:
+            os.chdir(PACKAGE_DIR)
+
+    _, reloads, deltas, reader_tasks = reader_report
+    print(f"{workers} writers x {operations} operations, 1 reader")
+    print(f"  expected tasks      {len(expected)}")
+    print(f"  on disk             {len(on_disk)}  {'ok' if on_disk == expected else 'MISMATCH'}")
+    print(f"  reader (Stage 4)    {len(reader_tasks)}  {'ok' if reader_tasks == expected else 'MISMATCH'}"
+          f"  ({reloads} full reloads, {deltas} journal-only refreshes)")
+    print(f"  failed commands     {failures}")
+    return on_disk == expected and reader_tasks == expected and not failures
+
+
+if __name__ == "__main__":
+    arguments = [int(arg) for arg in sys.argv[1:3]]
+    if not run_stress_test(*arguments):
+        sys.exit(1)
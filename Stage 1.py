@@ -1,7 +1,8 @@
-from datetime import datetime
+from task_dates import normalize_date
 
-# List initialized to store tasks, each task will be stored as a list
-tasks = []
+# Tasks keyed by lowercased name, each task will be stored as a list
+# (dicts keep insertion order, so tasks are still listed in the order they were added)
+tasks = {}
 
 
 # Functions for tasks operations
@@ -13,10 +14,9 @@ def add_task():
         return
 
     # Check if task name already exists
-    for task in tasks:
-        if task[0].lower() == name.lower():
-            print("Task already exists. Try updating it instead.")
-            return
+    if name.lower() in tasks:
+        print("Task already exists. Try updating it instead.")
+        return
 
     description = input("Enter task description: ").strip()
 
@@ -30,14 +30,12 @@ def add_task():
 
     # Validate due date input
     while True:
-        due_date = input("Enter due date (YYYY-MM-DD): ").strip()
-        try:
-            datetime.strptime(due_date, "%Y-%m-%d")
+        due_date = normalize_date(input("Enter due date (YYYY-MM-DD): ").strip())
+        if due_date is not None:
             break
-        except ValueError:
-            print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+        print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
 
-    tasks.append([name, description, priority, due_date])
+    tasks[name.lower()] = [name, description, priority, due_date]
     print(f"Task '{name}' added successfully!")
 
 
@@ -48,7 +46,7 @@ def view_tasks():
         return
 
     print("\nCurrent Tasks:")
-    for i, task in enumerate(tasks, start=1):
+    for i, task in enumerate(tasks.values(), start=1):
         print(f"{i}. {task[0]} | {task[1]} (Priority: {task[2]}, Due: {task[3]})")
 
 
@@ -56,37 +54,36 @@ def update_task():
     # Updates an existing task.
     name = input("\nEnter the name of the task to update: ").strip()
 
-    for task in tasks:
-        if task[0] == name:
-            print("Leave blank to keep the existing value.")
-
-            new_description = input("Enter new description: ").strip()
-            if new_description:
-                task[1] = new_description
-
-            valid_priorities = {"High", "Medium", "Low"}
-            while True:
-                new_priority = input("Enter new priority (High, Medium, Low): ").strip().capitalize()
-                if not new_priority:
-                    break
-                if new_priority in valid_priorities:
-                    task[2] = new_priority
-                    break
-                print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
-
-            while True:
-                new_due_date = input("Enter new due date (YYYY-MM-DD): ").strip()
-                if not new_due_date:
-                    break
-                try:
-                    datetime.strptime(new_due_date, "%Y-%m-%d")
-                    task[3] = new_due_date
-                    break
-                except ValueError:
-                    print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
-
-            print(f"Task '{name}' updated successfully!")
-            return
+    task = tasks.get(name.lower())
+    if task is not None and task[0] == name:
+        print("Leave blank to keep the existing value.")
+
+        new_description = input("Enter new description: ").strip()
+        if new_description:
+            task[1] = new_description
+
+        valid_priorities = {"High", "Medium", "Low"}
+        while True:
+            new_priority = input("Enter new priority (High, Medium, Low): ").strip().capitalize()
+            if not new_priority:
+                break
+            if new_priority in valid_priorities:
+                task[2] = new_priority
+                break
+            print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
+
+        while True:
+            new_due_date = input("Enter new due date (YYYY-MM-DD): ").strip()
+            if not new_due_date:
+                break
+            new_due_date = normalize_date(new_due_date)
+            if new_due_date is not None:
+                task[3] = new_due_date
+                break
+            print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+
+        print(f"Task '{name}' updated successfully!")
+        return
 
     print("Task not found.")
 
@@ -95,11 +92,11 @@ def delete_task():
     # Deletes a task from the list.
     name = input("\nEnter the name of the task to delete: ").strip()
 
-    for i, task in enumerate(tasks):
-        if task[0] == name:
-            tasks.pop(i)
-            print(f"Task '{name}' deleted successfully!")
-            return
+    task = tasks.get(name.lower())
+    if task is not None and task[0] == name:
+        del tasks[name.lower()]
+        print(f"Task '{name}' deleted successfully!")
+        return
 
     print("Task not found.")
 
@@ -1,7 +1,23 @@
-from datetime import datetime
+import csv
+import gc
+import io
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
 
-#List to store tasks, each task will be stored as a list
-tasks = []
+from task_dates import normalize_date
+from task_records import describe_skipped_lines, make_task_reader, read_task_record, write_task_rows
+
+TASKS_FILE = "tasks.txt"
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024  #Smaller files are parsed in this process
+CHUNK_BYTES = 16 * 1024 * 1024  #Size of the byte ranges handed to the worker processes
+DUPLICATE_NAME = "a name already used by an earlier task (ignoring case)"  #Reason for skipping a line
+
+#Tasks keyed by lowercased name, each task will be stored as a list
+#(dicts keep insertion order, so tasks are still listed in the order they were added)
+tasks = {}
 
 
 #Functions for tasks operations
@@ -13,10 +29,9 @@ def add_task():
         return
 
     #Checks if task name already exists
-    for task in tasks:
-        if task[0].lower() == name.lower():
-            print("Task already exists. Try updating it instead.")
-            return
+    if name.lower() in tasks:
+        print("Task already exists. Try updating it instead.")
+        return
 
     description = input("Enter task description: ").strip()
 
@@ -31,14 +46,12 @@ def add_task():
     #Validates
     # due date input
     while True:
-        due_date = input("Enter due date (YYYY-MM-DD): ").strip()
-        try:
-            datetime.strptime(due_date, "%Y-%m-%d")
+        due_date = normalize_date(input("Enter due date (YYYY-MM-DD): ").strip())
+        if due_date is not None:
             break
-        except ValueError:
-            print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+        print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
 
-    tasks.append([name, description, priority, due_date])
+    tasks[name.lower()] = [name, description, priority, due_date]
     print(f"Task '{name}' added successfully!")
 
 
@@ -49,7 +62,7 @@ def view_tasks():
         return
 
     print("\nCurrent Tasks:")
-    for i, task in enumerate(tasks, start=1):
+    for i, task in enumerate(tasks.values(), start=1):
         print(f"{i}. {task[0]} | {task[1]} (Priority: {task[2]}, Due: {task[3]})")
 
 
@@ -57,37 +70,36 @@ def update_task():
     #Updates an existing task.
     name = input("\nEnter the name of the task to update: ").strip()
 
-    for task in tasks:
-        if task[0] == name:
-            print("Leave blank to keep the existing value.")
-
-            new_description = input("Enter new description: ").strip()
-            if new_description:
-                task[1] = new_description
-
-            valid_priorities = {"High", "Medium", "Low"}
-            while True:
-                new_priority = input("Enter new priority (High, Medium, Low): ").strip().capitalize()
-                if not new_priority:
-                    break
-                if new_priority in valid_priorities:
-                    task[2] = new_priority
-                    break
-                print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
-
-            while True:
-                new_due_date = input("Enter new due date (YYYY-MM-DD): ").strip()
-                if not new_due_date:
-                    break
-                try:
-                    datetime.strptime(new_due_date, "%Y-%m-%d")
-                    task[3] = new_due_date
-                    break
-                except ValueError:
-                    print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
-
-            print(f"Task '{name}' updated successfully!")
-            return
+    task = tasks.get(name.lower())
+    if task is not None and task[0] == name:
+        print("Leave blank to keep the existing value.")
+
+        new_description = input("Enter new description: ").strip()
+        if new_description:
+            task[1] = new_description
+
+        valid_priorities = {"High", "Medium", "Low"}
+        while True:
+            new_priority = input("Enter new priority (High, Medium, Low): ").strip().capitalize()
+            if not new_priority:
+                break
+            if new_priority in valid_priorities:
+                task[2] = new_priority
+                break
+            print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
+
+        while True:
+            new_due_date = input("Enter new due date (YYYY-MM-DD): ").strip()
+            if not new_due_date:
+                break
+            new_due_date = normalize_date(new_due_date)
+            if new_due_date is not None:
+                task[3] = new_due_date
+                break
+            print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+
+        print(f"Task '{name}' updated successfully!")
+        return
 
     print("Task not found.")
 
@@ -96,42 +108,156 @@ def delete_task():
     #Deletes a task from the list.
     name = input("\nEnter the name of the task to delete: ").strip()
 
-    for i, task in enumerate(tasks):
-        if task[0] == name:
-            tasks.pop(i)
-            print(f"Task '{name}' deleted successfully!")
-            return
+    task = tasks.get(name.lower())
+    if task is not None and task[0] == name:
+        del tasks[name.lower()]
+        print(f"Task '{name}' deleted successfully!")
+        return
 
     print("Task not found.")
 
 
-def load_tasks_from_file():
-    #Loads tasks from a file
+@contextmanager
+def gc_paused():
+    #Pauses the garbage collector while building lots of objects that all stay alive
+    #(its collections would only walk them over and over)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def read_lines(file, data, consumed, record_lines):
+    #Yields the lines of a chunk's bytes, then of the file after it, keeping count of the bytes
+    #used and the lines of the record being parsed
+    for line in chain(io.BytesIO(data), file):
+        consumed[0] += len(line)
+        text = line.decode("utf-8", "replace")
+        record_lines.append(text)
+        yield text
+
+
+def parse_chunk(file_name, start, end):
+    #Parses the records that start between two byte offsets of a tasks file. Returns the tasks
+    #keyed by lowercased name, a Counter of skipped lines by reason and the offset where
+    #parsing stopped (past end when the last record runs on beyond the range).
+    with gc_paused(), open(file_name, "rb") as file:
+        file.seek(start)
+        data = file.read(max(0, end - start))
+        #Fast path: parse the whole range at once. Strict parsing fails on a quote left open at
+        #the end of the range or anywhere else, and those ranges take the careful path below.
+        reader = make_task_reader(io.StringIO(data.decode("utf-8", "replace")))
+        try:
+            rows = list(reader)
+        except csv.Error:
+            rows = None
+        if rows is not None:
+            malformed = sum(1 for row in rows if row and len(row) != 4)
+            if not malformed or reader.line_num == len(rows):
+                errors = Counter({"missing or extra information": malformed} if malformed else {})
+                chunk_tasks = key_rows([row for row in rows if len(row) == 4], errors)
+                return chunk_tasks, errors, end
+        rows, errors, stopped = parse_records(file, data, end - start)
+        chunk_tasks = key_rows(rows, errors)
+    return chunk_tasks, errors, start + stopped
+
+
+def key_rows(rows, errors):
+    #Keys rows by lowercased name, keeping the first of any names that differ only in case.
+    #The others are counted in errors, so the user hears about them before the next save.
+    chunk_tasks = {}
+    for row in rows:
+        if chunk_tasks.setdefault(row[0].lower(), row) is not row:
+            errors[DUPLICATE_NAME] += 1
+    return chunk_tasks
+
+
+def parse_records(file, data, length):
+    #Parses records one at a time from a range's bytes (reading on in the file for the last
+    #one), so the bytes used are known and a badly quoted record can be read again line by
+    #line. Returns the rows, a Counter of skipped lines by reason and the bytes used.
+    rows = []
+    errors = Counter()
+    consumed = [0]
+    record_lines = []
+    reader = make_task_reader(read_lines(file, data, consumed, record_lines))
+    while consumed[0] < length:
+        record_rows = read_task_record(reader, record_lines, errors)
+        if record_rows is None:
+            break
+        rows.extend(record_rows)
+    return rows, errors, consumed[0]
+
+
+def find_chunk_ranges(file_name, chunk_bytes=CHUNK_BYTES):
+    #Splits a file into byte ranges of about chunk_bytes that each start at the beginning of a line
+    size = os.path.getsize(file_name)
+    ranges = []
+    start = 0
+    with open(file_name, "rb") as file:
+        while start < size:
+            file.seek(start + chunk_bytes)
+            file.readline()
+            end = min(size, file.tell())
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def load_tasks_from_file(file_name=TASKS_FILE, workers=None):
+    #Loads tasks from a file of comma-separated records (quoted where a field holds a comma,
+    #quote or line break). Large files are split into byte ranges parsed by a process pool,
+    #then merged in file order (workers defaults to one per CPU). Returns a Counter of
+    #skipped lines by reason.
+    errors = Counter()
+    workers = workers or os.cpu_count() or 1
     try:
-        with open("tasks.txt", "r") as file:
-            for line in file:
-                try:
-                    parts = line.strip().split(",")
-                    if len(parts) == 4:
-                        name, description, priority, due_date = parts
-                        tasks.append([name, description, priority, due_date])
+        size = os.path.getsize(file_name)
+        if size < PARALLEL_MIN_BYTES or workers == 1:
+            ranges = [(0, size)]
+            results = [parse_chunk(file_name, 0, size)]
+        else:
+            ranges = find_chunk_ranges(file_name)
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(parse_chunk, [file_name] * len(ranges), *zip(*ranges)))
+
+        position = 0
+        for (start, end), (chunk_tasks, chunk_errors, stopped) in zip(ranges, results):
+            if start != position:
+                #The previous record ran on past this range's start, so the range was split
+                #inside a quoted field: parse it again from where that record ended
+                if position >= end:
+                    continue
+                chunk_tasks, chunk_errors, stopped = parse_chunk(file_name, position, end)
+            if tasks:
+                for key, task in chunk_tasks.items():
+                    if key in tasks:
+                        chunk_errors[DUPLICATE_NAME] += 1
                     else:
-                        print("Skipping a line with missing or extra information.")
-                except ValueError:
-                    print("Skipping a corrupted line due to formatting issues.")
+                        tasks[key] = task
+            else:
+                tasks.update(chunk_tasks)
+            errors.update(chunk_errors)
+            position = stopped
+
+        if errors:
+            print(describe_skipped_lines(errors))
         print("Tasks loaded successfully!")
     except FileNotFoundError:
         print("No saved tasks found. Starting newly.")
     except Exception as e:
         print(f"Oops, something went wrong while loading tasks: {e}")
+    return errors
 
 
-def save_tasks_to_file():
-    #Saves tasks to a file
+def save_tasks_to_file(file_name=TASKS_FILE):
+    #Saves tasks to a file, quoting the fields that hold commas, quotes or line breaks
     try:
-        with open("tasks.txt", "w") as file:
-            for task in tasks:
-                file.write(f"{task[0]},{task[1]},{task[2]},{task[3]}\n")
+        with open(file_name, "w", newline="") as file:
+            write_task_rows(file, tasks.values())
         print("All tasks have been saved successfully!")
     except Exception as e:
         print(f"An error occurred while saving tasks: {e}")
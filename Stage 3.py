@@ -1,8 +1,46 @@
+import argparse
+import csv
 import json
-from datetime import datetime
-
-# List to store tasks, each task is a dictionary now
-tasks = []
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from task_dates import normalize_date
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks on this platform; processes aren't coordinated
+    fcntl = None
+
+# Tasks keyed by lowercased name, each task is a dictionary now
+# (dicts keep insertion order, so this still lists tasks in the order they were added)
+tasks = {}
+
+# Snapshot and write-ahead journal files
+TASKS_FILE = "tasks.json"
+JOURNAL_FILE = "tasks.journal"
+LOCK_FILE = "tasks.lock"  # Advisory lock shared by every process using tasks.json
+FSYNC_BATCH_SIZE = 20  # Journal records written between fsync calls
+COMPACT_INTERVAL_SECONDS = 60  # How often the background thread folds the journal into the snapshot
+VIEW_PAGE_SIZE = 20  # Tasks the menu shows before asking whether to show more
+
+# Journal state, guarded by journal_lock together with every change to tasks
+journal_lock = threading.RLock()
+journal_file = None
+journaled_records = 0  # Records written since the last compaction
+unsynced_records = 0  # Records written since the last fsync
+
+# What this process has read: the tasks.json it loaded and how far into the journal it got
+snapshot_signature = None
+journal_offset = 0
+lock_file = None
+lock_depth = 0  # Nesting depth of store_lock in this process
+
+VALID_PRIORITIES = {"High", "Medium", "Low"}
+TASK_FIELDS = ("name", "description", "priority", "due_date")
 
 
 # Functions for CRUD operations
@@ -13,29 +51,25 @@ def add_task():
         return
 
     # Check for duplicates
-    for task in tasks:
-        if task["name"].lower() == name.lower():
-            print("Task already exists. Try updating it instead.")
-            return
+    if name.lower() in tasks:
+        print("Task already exists. Try updating it instead.")
+        return
 
     description = input("Enter task description: ").strip()
 
     # Ensure priority is valid
-    valid_priorities = {"High", "Medium", "Low"}
     while True:
         priority = input("Enter priority (High, Medium, Low): ").strip().capitalize()
-        if priority in valid_priorities:
+        if priority in VALID_PRIORITIES:
             break
         print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
 
     # Valid date format
     while True:
-        due_date = input("Enter due date (YYYY-MM-DD): ").strip()
-        try:
-            datetime.strptime(due_date, "%Y-%m-%d")
+        due_date = normalize_date(input("Enter due date (YYYY-MM-DD): ").strip())
+        if due_date is not None:
             break
-        except ValueError:
-            print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+        print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
 
     # Create and add the new task
     new_task = {
@@ -44,59 +78,86 @@ def add_task():
         "priority": priority,
         "due_date": due_date
     }
-    tasks.append(new_task)
+    with store_lock():
+        refresh_tasks()  # Another process may have added it meanwhile
+        if name.lower() in tasks:
+            print("Task already exists. Try updating it instead.")
+            return
+        tasks[name.lower()] = new_task
+        append_to_journal({"op": "add", "task": new_task})
     print(f"Task '{name}' added successfully!")
 
 
-# Display tasks in readable format
-def view_tasks():
+# Display tasks in readable format, page_size at a time with a prompt between pages
+# (page_size=None prints straight through; offset and limit pick out a slice of the list)
+def view_tasks(page_size=VIEW_PAGE_SIZE, offset=0, limit=None):
     if not tasks:
         print("\nNo tasks available.")
         return
 
     print("\nCurrent Tasks:")
-    for i, task in enumerate(tasks, start=1):
-        print(f"{i}. {task['name']} | {task['description']} (Priority: {task['priority']}, Due: {task['due_date']})")
+    end = len(tasks) if limit is None else min(len(tasks), offset + limit)
+    position = offset
+    while position < end:
+        # Take each page under the lock: the background compaction may refresh tasks between pages
+        with journal_lock:
+            page = list(islice(tasks.values(), position, min(end, position + (page_size or end))))
+        if not page:
+            break
+        for i, task in enumerate(page, start=position + 1):
+            print(f"{i}. {task['name']} | {task['description']} (Priority: {task['priority']}, Due: {task['due_date']})")
+        position += len(page)
+        if page_size and position < end:
+            if input(f"-- {position} of {end} shown, Enter for more or q to stop: ").strip().lower() == "q":
+                break
 
 
 # Update an existing task's fields
 def update_task():
     name = input("\nEnter the name of the task to update: ").strip()
 
-    for task in tasks:
-        if task["name"] == name:
-            print("Leave blank to keep the existing value.")
-
-            # Update an existing task's fields
-            new_description = input("Enter new description: ").strip()
-            if new_description:
-                task["description"] = new_description
-
-            # Update priority with validation
-            valid_priorities = {"High", "Medium", "Low"}
-            while True:
-                new_priority = input("Enter new priority (High, Medium, Low): ").strip().capitalize()
-                if not new_priority:
-                    break
-                if new_priority in valid_priorities:
-                    task["priority"] = new_priority
-                    break
-                print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
-
-            # Update due date with validation
-            while True:
-                new_due_date = input("Enter new due date (YYYY-MM-DD): ").strip()
-                if not new_due_date:
-                    break
-                try:
-                    datetime.strptime(new_due_date, "%Y-%m-%d")
-                    task["due_date"] = new_due_date
-                    break
-                except ValueError:
-                    print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+    task = tasks.get(name.lower())
+    if task is not None and task["name"] == name:
+        print("Leave blank to keep the existing value.")
+        changes = {}
+
+        # Update an existing task's fields
+        new_description = input("Enter new description: ").strip()
+        if new_description:
+            changes["description"] = new_description
+
+        # Update priority with validation
+        while True:
+            new_priority = input("Enter new priority (High, Medium, Low): ").strip().capitalize()
+            if not new_priority:
+                break
+            if new_priority in VALID_PRIORITIES:
+                changes["priority"] = new_priority
+                break
+            print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
+
+        # Update due date with validation
+        while True:
+            new_due_date = input("Enter new due date (YYYY-MM-DD): ").strip()
+            if not new_due_date:
+                break
+            new_due_date = normalize_date(new_due_date)
+            if new_due_date is not None:
+                changes["due_date"] = new_due_date
+                break
+            print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
 
-            print(f"Task '{name}' updated successfully!")
-            return
+        # Apply all changes at once so the journal never sees a half-updated task
+        with store_lock():
+            refresh_tasks()
+            task = tasks.get(name.lower())
+            if task is None or task["name"] != name:
+                print("Task not found. Another process deleted it.")
+                return
+            task.update(changes)
+            append_to_journal({"op": "update", "task": task})
+        print(f"Task '{name}' updated successfully!")
+        return
 
     print("Task not found.")
 
@@ -105,32 +166,45 @@ def update_task():
 def delete_task():
     name = input("\nEnter the name of the task to delete: ").strip()
 
-    for i, task in enumerate(tasks):
-        if task["name"] == name:
-            tasks.pop(i)
-            print(f"Task '{name}' deleted successfully!")
-            return
+    task = tasks.get(name.lower())
+    if task is not None and task["name"] == name:
+        with store_lock():
+            refresh_tasks()
+            task = tasks.get(name.lower())
+            if task is None or task["name"] != name:
+                print("Task not found. Another process deleted it.")
+                return
+            del tasks[name.lower()]
+            append_to_journal({"op": "delete", "name": name})
+        print(f"Task '{name}' deleted successfully!")
+        return
 
     print("Task not found.")
 
 
 # JSON file handling functions
 
-# Load tasks from JSON file
-def load_tasks_from_json():
+# Load tasks from JSON file (quiet skips the success message, for scripted commands)
+def load_tasks_from_json(quiet=False):
+    global snapshot_signature
     try:
-        with open("tasks.json", "r") as file:
+        with open(TASKS_FILE, "r") as file:
+            snapshot_signature = get_file_signature(file.fileno())
             data = json.load(file)
             if isinstance(data, list):
                 for item in data:
-                    # Ensure each loaded item has all necessary keys
-                    if all(k in item for k in ("name", "description", "priority", "due_date")):
-                        tasks.append(item)
-                    else:
+                    # Ensure each loaded item has all necessary keys, with text where text belongs
+                    if not (isinstance(item, dict) and all(k in item for k in TASK_FIELDS)
+                            and all(isinstance(item[k], str) for k in TASK_FIELDS[:3])):
                         print("Skipping malformed task data.")
-            print("Tasks loaded successfully!")
+                    elif tasks.setdefault(item["name"].lower(), item) is not item:
+                        # Told now, since the next save writes only the first of the two
+                        print(f"Skipping task '{item['name']}': an earlier task has the same name (ignoring case).")
+            if not quiet:
+                print("Tasks loaded successfully!")
     except FileNotFoundError:
-        print("No saved tasks found. Starting newly.")
+        if not quiet:
+            print("No saved tasks found. Starting newly.")
     except json.JSONDecodeError:
         print("Could not parse JSON. Starting with an empty task list.")
     except Exception as e:
@@ -140,18 +214,354 @@ def load_tasks_from_json():
 # Save tasks to a JSON file before program exits
 def save_tasks_to_json():
     try:
-        with open("tasks.json", "w") as file:
-            json.dump(tasks, file, indent=4)
+        compact_journal()
         print("All tasks have been saved successfully!")
     except Exception as e:
         print(f"An error occurred while saving tasks: {e}")
 
 
+# Multi-process coordination
+
+# Identify one version of a file cheaply: replacing it gives a new inode, rewriting it
+# a new mtime or size (accepts a path or an open file descriptor)
+def get_file_signature(file):
+    try:
+        info = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return info.st_ino, info.st_mtime_ns, info.st_size
+
+
+# Hold the advisory lock on the store, exclusive for changes and shared for reads. Also holds
+# journal_lock, and only the outermost call locks the file, so it can nest within a process
+# (a shared lock must not be upgraded by nesting an exclusive one inside it).
+@contextmanager
+def store_lock(exclusive=True):
+    global lock_file, lock_depth
+    with journal_lock:
+        if lock_depth == 0 and fcntl is not None:
+            if lock_file is None:
+                lock_file = open(LOCK_FILE, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        lock_depth += 1
+        try:
+            yield
+        finally:
+            lock_depth -= 1
+            if lock_depth == 0 and fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Catch up with changes other processes saved (call while holding store_lock): reload
+# everything if tasks.json was replaced, otherwise replay only the new journal records
+def refresh_tasks():
+    global journal_offset
+    if get_file_signature(TASKS_FILE) != snapshot_signature:
+        tasks.clear()
+        journal_offset = 0
+        load_tasks_from_json(quiet=True)
+    replay_journal(quiet=True)
+
+
+# Journal functions
+
+# Append one change record to the journal, fsyncing every FSYNC_BATCH_SIZE records
+# (other processes see it as soon as it is flushed)
+def append_to_journal(record):
+    global journal_file, journaled_records, unsynced_records, journal_offset
+    with store_lock():
+        if journal_file is None:
+            journal_file = open(JOURNAL_FILE, "a")
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        journal_file.write(line)
+        journal_file.flush()
+        end = os.fstat(journal_file.fileno()).st_size
+        if end - len(line.encode()) == journal_offset:
+            journal_offset = end  # Caught up already, so skip our own record on the next replay
+        journaled_records += 1
+        unsynced_records += 1
+        if unsynced_records >= FSYNC_BATCH_SIZE:
+            sync_journal()
+
+
+# Force journal records written so far onto disk
+def sync_journal():
+    global unsynced_records
+    with journal_lock:
+        if journal_file is not None and unsynced_records:
+            os.fsync(journal_file.fileno())
+            unsynced_records = 0
+
+
+# Apply one journal record to the task list (records are idempotent, so replaying twice is safe)
+def apply_journal_record(record):
+    if record["op"] == "delete":
+        tasks.pop(record["name"].lower(), None)
+    else:
+        key = record["task"]["name"].lower()
+        if key in tasks:
+            tasks[key].update(record["task"])
+        else:
+            tasks[key] = dict(record["task"])
+
+
+# Replay changes journaled since the last snapshot, starting where the last replay stopped
+# (a record still being written by another process is left for the next replay)
+def replay_journal(quiet=False):
+    global journal_offset
+    replayed = 0
+    try:
+        with open(JOURNAL_FILE, "rb") as file:
+            file.seek(journal_offset)
+            data = file.read()
+    except FileNotFoundError:
+        return
+    complete = data.rfind(b"\n") + 1
+    journal_offset += complete
+    for line in data[:complete].splitlines():
+        try:
+            apply_journal_record(json.loads(line))
+            replayed += 1
+        except (UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            print("Skipping a damaged journal record.")
+    if replayed and not quiet:
+        print(f"Recovered {replayed} unsaved change(s) from the journal.")
+
+
+# Fold the journal into a fresh snapshot of tasks.json and start a new journal
+def compact_journal():
+    global journal_file, journaled_records, unsynced_records, snapshot_signature, journal_offset
+    with store_lock():
+        refresh_tasks()  # Fold in what other processes journaled too
+        # Write the snapshot beside the old one and swap it in so a crash never leaves half a file
+        temp_file = f"{TASKS_FILE}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(list(tasks.values()), file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, TASKS_FILE)
+        snapshot_signature = get_file_signature(TASKS_FILE)
+        if journal_file is not None:
+            journal_file.close()
+        # Empty the journal but keep appending: other processes' handles stay valid that way
+        open(JOURNAL_FILE, "w").close()
+        journal_file = open(JOURNAL_FILE, "a")
+        journal_offset = 0
+        journaled_records = 0
+        unsynced_records = 0
+
+
+# Compact the journal every COMPACT_INTERVAL_SECONDS on a daemon thread
+def start_background_compaction():
+    def compact_periodically():
+        while True:
+            time.sleep(COMPACT_INTERVAL_SECONDS)
+            if not journaled_records:
+                continue
+            try:
+                compact_journal()
+            except OSError as e:
+                print(f"Background save failed: {e}")
+
+    threading.Thread(target=compact_periodically, daemon=True).start()
+
+
+# Bulk import and scripted commands
+
+# Read task records from a CSV (with a header row) or JSON Lines file, or "-" for stdin
+def read_task_records(source, file_format=None):
+    if file_format is None:
+        file_format = "jsonl" if source.endswith((".jsonl", ".ndjson")) else "csv"
+    file = sys.stdin if source == "-" else open(source, "r", newline="")
+    try:
+        if file_format == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        yield None  # Counted as a rejected record
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+# Validate a batch of records, skip duplicates and add the rest with a single write.
+# Returns the number of tasks imported and the number of records rejected.
+def import_tasks(records):
+    with store_lock():
+        refresh_tasks()  # Check for duplicates against the latest tasks
+        return import_new_tasks(records)
+
+
+# Check one imported or added record and return it as a clean task,
+# or None when a field is missing or it has an invalid name, priority or date
+def validate_task_record(record):
+    if not isinstance(record, dict) or not all(isinstance(record.get(k), str) for k in TASK_FIELDS):
+        return None
+    name = record["name"].strip()
+    priority = record["priority"].strip().capitalize()
+    due_date = normalize_date(record["due_date"].strip())
+    if not name or priority not in VALID_PRIORITIES or due_date is None:
+        return None
+    return {"name": name, "description": record["description"].strip(), "priority": priority, "due_date": due_date}
+
+
+# The body of import_tasks, run while holding the store lock
+def import_new_tasks(records):
+    new_tasks = {}
+    rejected = 0
+    for record in records:
+        task = validate_task_record(record)
+        # The seen-names set covers both existing tasks and earlier rows of this batch
+        if task is None or task["name"].lower() in tasks or task["name"].lower() in new_tasks:
+            rejected += 1
+            continue
+        new_tasks[task["name"].lower()] = task
+    if new_tasks:
+        tasks.update(new_tasks)
+        compact_journal()
+    return len(new_tasks), rejected
+
+
+# Write all tasks as CSV or JSON Lines to a file, or "-" for stdout
+def export_tasks(target, file_format=None):
+    if file_format is None:
+        file_format = "jsonl" if target.endswith((".jsonl", ".ndjson")) else "csv"
+    file = sys.stdout if target == "-" else open(target, "w", newline="")
+    try:
+        if file_format == "csv":
+            writer = csv.DictWriter(file, fieldnames=TASK_FIELDS)
+            writer.writeheader()
+            writer.writerows(tasks.values())
+        else:
+            for task in tasks.values():
+                file.write(json.dumps(task, separators=(",", ":")) + "\n")
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+
+# Parse the command line for scripted use without the menu
+def build_argument_parser():
+    parser = argparse.ArgumentParser(description="Manage tasks.json without the interactive menu.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="add a task")
+    add_parser.add_argument("name")
+    add_parser.add_argument("--description", default="")
+    add_parser.add_argument("--priority", required=True)
+    add_parser.add_argument("--due-date", required=True)
+
+    update_parser = commands.add_parser("update", help="update a task's fields")
+    update_parser.add_argument("name")
+    update_parser.add_argument("--description")
+    update_parser.add_argument("--priority")
+    update_parser.add_argument("--due-date")
+
+    delete_parser = commands.add_parser("delete", help="delete a task")
+    delete_parser.add_argument("name")
+
+    list_parser = commands.add_parser("list", help="list tasks")
+    list_parser.add_argument("--offset", type=int, default=0, help="tasks to skip first")
+    list_parser.add_argument("--limit", type=int, help="most tasks to list (default: all)")
+
+    for command, help_text, file_help in (("import", "bulk import tasks", "CSV or JSON Lines file, or - for stdin"),
+                                          ("export", "export all tasks", "target file, or - for stdout")):
+        file_parser = commands.add_parser(command, help=help_text)
+        file_parser.add_argument("file", help=file_help)
+        file_parser.add_argument("--format", choices=("csv", "jsonl"),
+                                 help="file format (default: from the file extension, else csv)")
+    return parser
+
+
+# Run one scripted command and return the process exit code
+def run_command(arguments):
+    options = build_argument_parser().parse_args(arguments)
+    with store_lock(exclusive=False):
+        refresh_tasks()
+
+    if options.command == "list":
+        view_tasks(page_size=None, offset=max(0, options.offset), limit=options.limit)
+    elif options.command == "export":
+        export_tasks(options.file, options.format)
+    elif options.command == "import":
+        start = time.perf_counter()
+        imported, rejected = import_tasks(read_task_records(options.file, options.format))
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        print(f"Imported {imported} task(s), rejected {rejected}, in {elapsed:.2f}s ({rate:.0f} tasks/s).")
+    elif options.command == "add":
+        # Journaled like update and delete; only bulk imports rewrite tasks.json
+        new_task = validate_task_record({"name": options.name, "description": options.description,
+                                         "priority": options.priority, "due_date": options.due_date})
+        if new_task is None:
+            print("Task not added: it has an invalid name, priority or date.")
+            return 1
+        with store_lock():
+            refresh_tasks()
+            if new_task["name"].lower() in tasks:
+                print("Task already exists. Try updating it instead.")
+                return 1
+            tasks[new_task["name"].lower()] = new_task
+            append_to_journal({"op": "add", "task": new_task})
+        sync_journal()
+        print(f"Task '{new_task['name']}' added successfully!")
+    else:
+        task = tasks.get(options.name.lower())
+        if task is None or task["name"] != options.name:
+            print("Task not found.")
+            return 1
+        if options.command == "delete":
+            with store_lock():
+                refresh_tasks()
+                task = tasks.get(options.name.lower())
+                if task is None or task["name"] != options.name:
+                    print("Task not found. Another process deleted it.")
+                    return 1
+                del tasks[options.name.lower()]
+                append_to_journal({"op": "delete", "name": options.name})
+        else:
+            changes = {}
+            if options.description:
+                changes["description"] = options.description
+            if options.priority:
+                changes["priority"] = options.priority.strip().capitalize()
+                if changes["priority"] not in VALID_PRIORITIES:
+                    print("Invalid priority! Please enter 'High', 'Medium', or 'Low'.")
+                    return 1
+            if options.due_date:
+                changes["due_date"] = normalize_date(options.due_date)
+                if changes["due_date"] is None:
+                    print("Invalid date format! Please enter the due date in YYYY-MM-DD format.")
+                    return 1
+            with store_lock():
+                refresh_tasks()
+                task = tasks.get(options.name.lower())
+                if task is None or task["name"] != options.name:
+                    print("Task not found. Another process deleted it.")
+                    return 1
+                task.update(changes)
+                append_to_journal({"op": "update", "task": task})
+        sync_journal()
+        print(f"Task '{options.name}' {options.command}d successfully!")
+    return 0
+
+
 # Main Menu Loop
 
+# Scripted commands, e.g. python "Stage 3.py" import tasks.csv
+if __name__ == "__main__" and len(sys.argv) > 1:
+    sys.exit(run_command(sys.argv[1:]))
+
 # Only runs when the script is executed directly
-if __name__ == "__main__":
-    load_tasks_from_json()  # Load saved tasks when program starts
+elif __name__ == "__main__":
+    with store_lock(exclusive=False):
+        load_tasks_from_json()  # Load saved tasks when program starts
+        replay_journal()  # Reapply changes made after the last snapshot
+    start_background_compaction()
     while True:
         print("\nTask Manager")
         print("==============")
@@ -163,6 +573,8 @@ if __name__ == "__main__":
         print("==============")
 
         choice = input("Enter your choice: ").strip()
+        with store_lock(exclusive=False):
+            refresh_tasks()  # Pick up changes made by other processes
         if choice == "1":
             add_task()
         elif choice == "2":
@@ -1,16 +1,328 @@
+import bisect
+import csv
+import functools
+import gc
+import heapq
 import json
-import tkinter as tk
-from tkinter import ttk
-from datetime import datetime
+import mmap
+import os
+import queue
+import re
+import struct
+import sys
+import textwrap
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from datetime import date
+from itertools import accumulate, chain, groupby, islice, takewhile
+from operator import attrgetter, itemgetter
+
+from task_dates import INVALID_DATE_ORDINAL, format_date_ordinal, get_date_ordinal
+from task_records import describe_skipped_lines, iter_task_rows, write_task_rows
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks on this platform; processes aren't coordinated
+    fcntl = None
+
+# tkinter is imported when the GUI starts (see import_tkinter) and sqlite3 when a SQLite store
+# is opened, so the command-line tools, the task service and the benchmarks start without them
+tk = ttk = None
+
+
+# Import tkinter into the module globals the GUI code uses
+def import_tkinter():
+    global tk, ttk
+    import tkinter as tk
+    from tkinter import ttk
+
+# Sort rank of each priority (unknown priorities sort last)
+PRIORITY_RANKS = {'High': 1, 'Medium': 2, 'Low': 3}
+UNKNOWN_PRIORITY_RANK = 4
+
+# Table rendering settings
+VISIBLE_ROWS = 25  # Rows shown in the table viewport
+ROW_BUFFER = 10  # Extra rows materialized above and below the viewport
+VIRTUAL_THRESHOLD = 1000  # Only materialize the rows around the viewport above this many rows
+RENDER_CHUNK_SIZE = 200  # Rows synced per root.after step when rendering the full list
+FRAME_BUDGET_MS = 16  # Target for one render step, checked at 100k rows by Benchmark.py
+NEXT_TASK_COUNT = 5  # Most urgent tasks listed in the "Next up" panel
+
+# Streaming loader settings
+TASK_FIELDS = ("name", "description", "priority", "due_date")
+TEXT_FIELDS = ("name", "description", "priority")  # Fields a task record must hold as strings
+READ_CHUNK_SIZE = 1 << 16  # Characters read from tasks.json at a time
+LOAD_BATCH_SIZE = 5000  # Tasks the GUI's loader thread adds to the task manager at a time
+LOAD_POLL_MS = 20  # How often the GUI checks for freshly loaded tasks
+QUERY_POLL_MS = 15  # How often the GUI checks for finished filter and sort queries
+FILTER_DEBOUNCE_MS = 200  # Pause in typing before the filter is re-applied
+CHANGE_POLL_MS = 2000  # How often the GUI checks tasks.json and the journal for other processes' changes
+STARTUP_POLL_MS = 5  # How often --startup-report checks the window's progress
+# Relative due date choices in the GUI, as (first, last) day offsets from today (None is open-ended)
+RELATIVE_DUE_RANGES = {"Overdue": (None, -1), "Due today": (0, 0), "Next 7 days": (0, 7), "Next 30 days": (0, 30)}
+WHITESPACE = re.compile(r'\s*')
+
+# Binary snapshot layout: header, then 8-byte aligned sections for the priority codes
+# ('b'), due dates ('i'), name ids ('i'), description ids ('i'), the date index ('I':
+# rows ordered by due date), the string offset table ('Q') and the UTF-8 string data.
+# The last priority_count strings are the priority names. All numbers are little-endian.
+SNAPSHOT_MAGIC = b'TASKSNAP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<8sHHII7Q')  # magic, version, priority count, task count, string count, section offsets
+SNAPSHOT_SECTIONS = (('priorities', 'b'), ('due_dates', 'i'), ('names', 'i'), ('descriptions', 'i'),
+                     ('date_index', 'I'), ('string_offsets', 'Q'), ('string_data', 'B'))
+
+# Task attribute holding the cached sort key for each sortable column
+SORT_KEY_ATTRIBUTES = {'name': 'sort_name', 'priority': 'priority_rank', 'due_date': 'date_ordinal'}
+
+METRICS_SAMPLE_LIMIT = 10000  # Most recent durations kept per operation for percentiles
+
+
+# Print cProfile or tracemalloc statistics for everything run inside the block (also usable
+# as a decorator). Statistics go to stderr, or to output_file when one is given.
+@contextmanager
+def profile_operation(label, mode='cprofile', output_file=None, limit=25):
+    if mode == 'cprofile':
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output_file:
+                profiler.dump_stats(output_file)
+            else:
+                print(f"Profile of {label}:", file=sys.stderr)
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(limit)
+    elif mode == 'tracemalloc':
+        import tracemalloc
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not was_tracing:
+                tracemalloc.stop()
+            lines = [f"Allocations in {label} (peak {peak / 1e6:.1f} MB):"]
+            lines.extend(str(stat) for stat in after.compare_to(before, 'lineno')[:limit])
+            if output_file:
+                with open(output_file, 'w') as file:
+                    file.write("\n".join(lines) + "\n")
+            else:
+                print("\n".join(lines), file=sys.stderr)
+    else:
+        raise ValueError("mode must be 'cprofile' or 'tracemalloc'")
+
+
+# Opt-in timers and counters for the hot paths. While disabled, instrumented calls cost one
+# attribute check; enable with METRICS.enable() or the GUI's --metrics option.
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    # Start recording
+    def enable(self):
+        self.enabled = True
+
+    # Stop recording (collected metrics are kept until reset)
+    def disable(self):
+        self.enabled = False
+
+    # Forget everything recorded so far
+    def reset(self):
+        with self.lock:
+            self.samples = {}  # operation -> recent durations in ms
+            self.totals = {}  # operation -> [call count, total ms]
+            self.counters = {}  # counter name -> value
+            self.profilers = {}  # operation -> (profile mode, output file)
+
+    # Profile every following call of an operation (see profile_operation)
+    def attach_profiler(self, operation, mode='cprofile', output_file=None):
+        self.profilers[operation] = (mode, output_file)
+
+    # Stop profiling an operation
+    def detach_profiler(self, operation):
+        self.profilers.pop(operation, None)
+
+    # Record one duration of an operation
+    def record(self, operation, ms):
+        with self.lock:
+            samples = self.samples.get(operation)
+            if samples is None:
+                samples = self.samples[operation] = deque(maxlen=METRICS_SAMPLE_LIMIT)
+                self.totals[operation] = [0, 0.0]
+            samples.append(ms)
+            totals = self.totals[operation]
+            totals[0] += 1
+            totals[1] += ms
+
+    # Add to a counter
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Time the block as one call of an operation, profiling it when a profiler is attached
+    @contextmanager
+    def measure(self, operation):
+        profiler = self.profilers.get(operation)
+        profiling = profile_operation(operation, *profiler) if profiler else nullcontext()
+        start = time.perf_counter()
+        try:
+            with profiling:
+                yield
+        finally:
+            self.record(operation, (time.perf_counter() - start) * 1000)
+
+    # Summarize the timers (with p50/p95/p99 over the recent samples), counters and
+    # scanned-to-returned ratios as a JSON-ready dict
+    def snapshot(self):
+        with self.lock:
+            timers = {}
+            for operation, samples in self.samples.items():
+                ordered = sorted(samples)
+                calls, total_ms = self.totals[operation]
+
+                def percentile(p):
+                    return round(ordered[max(0, -(-len(ordered) * p // 100) - 1)], 3)
+
+                timers[operation] = {"count": calls, "total_ms": round(total_ms, 3), "p50_ms": percentile(50),
+                                     "p95_ms": percentile(95), "p99_ms": percentile(99), "max_ms": round(ordered[-1], 3)}
+            counters = dict(self.counters)
+        scan_ratios = {}
+        for name, scanned in counters.items():
+            if name.endswith(".scanned"):
+                operation = name[:-len(".scanned")]
+                returned = counters.get(operation + ".returned", 0)
+                scan_ratios[operation] = round(scanned / returned, 3) if returned else None
+        return {"timers": timers, "counters": counters, "scan_ratios": scan_ratios}
+
+    # Write the metrics snapshot to a JSON file
+    def dump(self, metrics_file):
+        with open(metrics_file, 'w') as file:
+            json.dump(self.snapshot(), file, indent=4)
+
+
+METRICS = Metrics()
+
+
+# Decorator timing every call of a method as the given operation while METRICS is enabled
+def instrumented(operation):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            with METRICS.measure(operation):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Turn a date or YYYY-MM-DD string bounding a date range query into a day ordinal
+def get_bound_ordinal(value):
+    if isinstance(value, date):
+        return value.toordinal()
+    ordinal = get_date_ordinal(value)
+    if ordinal == INVALID_DATE_ORDINAL:
+        raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+    return ordinal
+
+
+# Normalize an inclusive (first, last) date range, where None leaves that end open,
+# to a pair of day ordinals (returns None for no range)
+def get_ordinal_range(due_range):
+    if due_range is None:
+        return None
+    first, last = due_range
+    first = 0 if first is None else get_bound_ordinal(first)
+    last = INVALID_DATE_ORDINAL - 1 if last is None else get_bound_ordinal(last)
+    return first, last
+
+
+# Yield Task objects from a JSON array of task records without reading the whole file first.
+# Records missing a field, or whose name, description or priority isn't a string, are skipped
+# (a due date that isn't a valid date string is kept and sorts last).
+def iter_tasks_from_json(json_file):
+    decoder = json.JSONDecoder()
+    with open(json_file, 'r') as file:
+        buffer = ''
+        pos = 0
+        started = False
+        expect_record = True  # False right after a record, until the next comma
+        after_comma = False
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                chunk = file.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise json.JSONDecodeError("Unexpected end of file", buffer, pos)
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise json.JSONDecodeError("Expected a list of tasks", buffer, pos)
+                started = True
+                pos += 1
+            elif char == ']' and not after_comma:
+                return
+            elif not expect_record:
+                if char != ',':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                expect_record = after_comma = True
+                pos += 1
+            else:
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # The record may just be cut off at the end of the buffer
+                    chunk = file.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        raise
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+                expect_record = after_comma = False
+                if (isinstance(record, dict) and all(k in record for k in TASK_FIELDS)
+                        and all(type(record[k]) is str for k in TEXT_FIELDS)):
+                    yield Task(*(record[k] for k in TASK_FIELDS))
+                else:
+                    print("Skipping malformed task data.")
 
 
 class Task:
+    # Fixed attribute slots instead of a per-instance __dict__ keep each task small
+    __slots__ = ("name", "description", "priority", "due_date", "seq", "change_seq", "sort_name", "priority_rank",
+                 "date_ordinal")
+
     # Initialize a task with name, description, priority and due date
-    def __init__(self, name, description, priority, due_date):
+    # (date_ordinal can be passed when the due date is already known to be valid)
+    def __init__(self, name, description, priority, due_date, date_ordinal=None):
         self.name = name
         self.description = description
-        self.priority = priority
+        self.priority = sys.intern(priority) if isinstance(priority, str) else priority  # One shared copy per priority
         self.due_date = due_date
+        self.seq = None  # Insertion number assigned by the TaskManager
+        self.change_seq = None  # Number of the TaskManager change that last added or updated it
+        self.refresh_sort_keys(date_ordinal)
+
+    # Cache the casefolded name, priority rank and date ordinal used for sorting
+    def refresh_sort_keys(self, date_ordinal=None):
+        sort_name = self.name.casefold()
+        self.sort_name = self.name if sort_name == self.name else sort_name  # Share the string when unchanged
+        self.priority_rank = PRIORITY_RANKS.get(self.priority, UNKNOWN_PRIORITY_RANK)
+        self.date_ordinal = get_date_ordinal(self.due_date) if date_ordinal is None else date_ordinal
 
     # Convert task object to dictionary for JSON serialization
     def to_dict(self):
@@ -22,72 +334,1938 @@ class Task:
         }
 
 
+# Decode a columnar due date: a day ordinal, or -(string id + 1) for an unparseable date
+def decode_due_date(value, strings):
+    if value < 0:
+        return strings[-value - 1]
+    return format_date_ordinal(value)
+
+
+class TaskStore:
+    # Columnar storage for large numbers of tasks: priorities as interned codes in an
+    # array('b'), due dates as day ordinals in an array('i') and names and descriptions
+    # as ids into one shared string table
+    def __init__(self, tasks=()):
+        self.priority_names = []  # priority code -> priority string
+        self.priority_codes = {}  # priority string -> priority code
+        self.strings = []  # string id -> string
+        self.string_ids = {}  # string -> string id
+        self.priorities = array('b')
+        self.due_dates = array('i')  # day ordinal, or -(string id + 1) for unparseable dates
+        self.names = array('i')
+        self.descriptions = array('i')
+        for task in tasks:
+            self.append(task)
+
+    # Get the id of a string in the shared table, adding it if needed
+    def intern_string(self, text):
+        string_id = self.string_ids.get(text)
+        if string_id is None:
+            string_id = self.string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    # Get the code for a priority, adding it if needed
+    def intern_priority(self, priority):
+        code = self.priority_codes.get(priority)
+        if code is None:
+            code = self.priority_codes[priority] = len(self.priority_names)
+            self.priority_names.append(priority)
+        return code
+
+    # Encode a due date string as a day ordinal, keeping unparseable dates as strings
+    def encode_due_date(self, due_date):
+        ordinal = get_date_ordinal(due_date)
+        if ordinal == INVALID_DATE_ORDINAL:
+            return -(self.intern_string(due_date) + 1)
+        return ordinal
+
+    # Decode a stored due date back to a YYYY-MM-DD string
+    def decode_due_date(self, value):
+        return decode_due_date(value, self.strings)
+
+    # Add a task (or anything with the Task attributes) as a new row
+    def append(self, task):
+        self.names.append(self.intern_string(task.name))
+        self.descriptions.append(self.intern_string(task.description))
+        self.priorities.append(self.intern_priority(task.priority))
+        self.due_dates.append(self.encode_due_date(task.due_date))
+
+    def __len__(self):
+        return len(self.names)
+
+    # Get a lightweight view of a row
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("task row out of range")
+        return TaskView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield TaskView(self, row)
+
+
+class TaskView:
+    # A row of a TaskStore with the same attributes as Task
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def name(self):
+        return self.store.strings[self.store.names[self.row]]
+
+    @name.setter
+    def name(self, value):
+        self.store.names[self.row] = self.store.intern_string(value)
+
+    @property
+    def description(self):
+        return self.store.strings[self.store.descriptions[self.row]]
+
+    @description.setter
+    def description(self, value):
+        self.store.descriptions[self.row] = self.store.intern_string(value)
+
+    @property
+    def priority(self):
+        return self.store.priority_names[self.store.priorities[self.row]]
+
+    @priority.setter
+    def priority(self, value):
+        self.store.priorities[self.row] = self.store.intern_priority(value)
+
+    @property
+    def due_date(self):
+        return self.store.decode_due_date(self.store.due_dates[self.row])
+
+    @due_date.setter
+    def due_date(self, value):
+        self.store.due_dates[self.row] = self.store.encode_due_date(value)
+
+    # Convert the row to a dictionary for JSON serialization
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "priority": self.priority,
+            "due_date": self.due_date
+        }
+
+    # Copy the row into a standalone Task
+    def to_task(self):
+        ordinal = self.store.due_dates[self.row]
+        return Task(self.name, self.description, self.priority, self.due_date, ordinal if ordinal >= 0 else None)
+
+
+# Write tasks (any iterable of objects with the Task attributes) to a binary snapshot
+def write_snapshot(tasks, snapshot_file):
+    store = TaskStore(tasks)
+    strings = store.strings + store.priority_names
+    encoded = [text.encode('utf-8') for text in strings]
+    string_offsets = array('Q', [0])
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+    date_index = array('I', sorted(range(len(store)), key=store.due_dates.__getitem__))
+    sections = [store.priorities, store.due_dates, store.names, store.descriptions,
+                date_index, string_offsets, b''.join(encoded)]
+
+    temp_file = snapshot_file + '.tmp'
+    with open(temp_file, 'wb') as file:
+        file.write(bytes(SNAPSHOT_HEADER.size))  # Filled in once the offsets are known
+        offsets = []
+        for section in sections:
+            file.write(bytes(-file.tell() % 8))  # Align every section to 8 bytes
+            offsets.append(file.tell())
+            if isinstance(section, array) and sys.byteorder != 'little':
+                section = array(section.typecode, section)
+                section.byteswap()
+            file.write(section)
+        file.seek(0)
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(store.priority_names),
+                                        len(store), len(strings), *offsets))
+    os.replace(temp_file, snapshot_file)
+
+
+class SnapshotStrings:
+    # The string table of a snapshot, decoded one string at a time
+    def __init__(self, data, offsets, count):
+        self.data = data
+        self.offsets = offsets
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, string_id):
+        return str(self.data[self.offsets[string_id]:self.offsets[string_id + 1]], 'utf-8')
+
+
+class TaskSnapshot:
+    # Memory-mapped, read-only binary snapshot. The fixed-width columns are used in place
+    # without copying and tasks are only decoded when read, as TaskView rows.
+    def __init__(self, snapshot_file):
+        if sys.byteorder != 'little':
+            raise ValueError("Binary snapshots can only be mapped on little-endian machines")
+        with open(snapshot_file, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, priority_count, task_count, string_count, *offsets = \
+                SNAPSHOT_HEADER.unpack_from(self.map)
+        except struct.error:
+            self.map.close()
+            raise ValueError(f"{snapshot_file} is too short to be a task snapshot")
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.map.close()
+            raise ValueError(f"{snapshot_file} is not a version {SNAPSHOT_VERSION} task snapshot")
+
+        lengths = {'priorities': task_count, 'due_dates': task_count, 'names': task_count,
+                   'descriptions': task_count, 'date_index': task_count, 'string_offsets': string_count + 1}
+        view = memoryview(self.map)
+        self.views = []
+        for (section, typecode), offset in zip(SNAPSHOT_SECTIONS, offsets):
+            if section == 'string_data':
+                column = view[offset:]
+            else:
+                size = struct.calcsize(typecode) * lengths[section]
+                column = view[offset:offset + size].cast(typecode)
+            self.views.append(column)
+            setattr(self, section, column)
+        self.views.append(view)
+        self.strings = SnapshotStrings(self.string_data, self.string_offsets, string_count - priority_count)
+        self.priority_names = [SnapshotStrings(self.string_data, self.string_offsets, string_count)[i]
+                               for i in range(string_count - priority_count, string_count)]
+
+    def decode_due_date(self, value):
+        return decode_due_date(value, self.strings)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Get a read-only view of a row
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("task row out of range")
+        return TaskView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield TaskView(self, row)
+
+    # Yield every row as a standalone Task. The string table is decoded once up front, so
+    # repeated strings are shared between tasks and dates are taken from the ordinal column.
+    def iter_tasks(self):
+        offsets = self.string_offsets
+        strings = [str(self.string_data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(len(self.strings))]
+        priorities = [sys.intern(priority) for priority in self.priority_names]
+        for name, description, priority, due_date in zip(self.names, self.descriptions, self.priorities, self.due_dates):
+            if due_date >= 0:
+                yield Task(strings[name], strings[description], priorities[priority], format_date_ordinal(due_date), due_date)
+            else:
+                yield Task(strings[name], strings[description], priorities[priority], strings[-due_date - 1])
+
+    # Get the rows due between two dates or YYYY-MM-DD strings (inclusive) by bisecting the date index
+    def get_tasks_due_between(self, start_date, end_date):
+        due_date_of_row = self.due_dates.__getitem__
+        lo = bisect.bisect_left(self.date_index, get_bound_ordinal(start_date), key=due_date_of_row)
+        hi = bisect.bisect_right(self.date_index, get_bound_ordinal(end_date), key=due_date_of_row)
+        return [TaskView(self, row) for row in sorted(self.date_index[lo:hi])]
+
+    # Release the memory views and unmap the file
+    def close(self):
+        for column in reversed(self.views):
+            column.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Yield Task objects from a tasks.txt (Stage 2's CSV format), skipping malformed lines
+def iter_tasks_from_txt(txt_file):
+    errors = Counter()
+    with open(txt_file, 'r', newline='') as file:
+        for row in iter_task_rows(file, errors):
+            yield Task(*row)
+    if errors:
+        print(describe_skipped_lines(errors))
+
+
+# Identify one version of a file cheaply: replacing it gives a new inode, rewriting it
+# a new mtime or size (None when the file doesn't exist)
+def get_file_signature(path):
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return info.st_ino, info.st_mtime_ns, info.st_size
+
+
+# Get the binary snapshot the GUI keeps as a startup cache of a tasks.json
+def get_snapshot_cache_file(json_file):
+    return os.path.splitext(json_file)[0] + ".cache.snap"
+
+
+# Check whether a startup cache holds the tasks.json with the given signature (a cache is
+# stamped with the modification time of the tasks.json it was written from)
+def is_snapshot_cache_fresh(cache_file, signature):
+    cache_signature = get_file_signature(cache_file)
+    return signature is not None and cache_signature is not None and cache_signature[1] == signature[1]
+
+
+# Write a startup cache of the tasks read from the tasks.json with the given signature
+def write_snapshot_cache(tasks, cache_file, signature):
+    write_snapshot(tasks, cache_file)
+    os.utime(cache_file, ns=(signature[1], signature[1]))
+
+
+# Stream tasks to a file in the same layout as json.dump(..., indent=4)
+def write_tasks_json(tasks, file):
+    separator = "[\n"
+    for task in tasks:
+        file.write(separator + textwrap.indent(json.dumps(task.to_dict(), indent=4), "    "))
+        separator = ",\n"
+    file.write("\n]" if separator == ",\n" else "[]")
+
+
+# Convert between tasks.json, tasks.txt and binary snapshot files, chosen by file extension
+def convert_task_file(source_file, target_file):
+    readers = {'.json': iter_tasks_from_json, '.txt': iter_tasks_from_txt, '.snap': TaskSnapshot}
+    source_type = os.path.splitext(source_file)[1]
+    target_type = os.path.splitext(target_file)[1]
+    if source_type not in readers or target_type not in readers:
+        raise ValueError("Files must end in .json, .txt or .snap")
+    tasks = readers[source_type](source_file)
+    try:
+        if target_type == '.snap':
+            write_snapshot(tasks, target_file)
+        elif target_type == '.json':
+            with open(target_file, 'w') as file:
+                write_tasks_json(tasks, file)
+        else:
+            with open(target_file, 'w', newline='') as file:
+                write_task_rows(file, ((task.name, task.description, task.priority, task.due_date) for task in tasks))
+    finally:
+        if isinstance(tasks, TaskSnapshot):
+            tasks.close()
+
+
+# Scan the whole list instead of walking an index once the index matches more than 1/SCAN_FRACTION of it
+SCAN_FRACTION = 8
+FILTER_CACHE_SIZE = 32  # Recent filter results kept for repeated and narrowing queries
+DEFAULT_PAGE_SIZE = 50  # Tasks per page when get_task_page isn't given a limit
+ITER_PAGE_SIZE = 500  # First page fetched by iter_tasks; later pages double in size
+VECTOR_CHUNK_SIZE = 512  # Tasks per TaskVector chunk: a change copies one chunk and the list of chunks
+
+# Urgency of a task: its priority rank weighted against the days left until it is due
+URGENCY_PRIORITY_WEIGHT = 7  # Days of due date that one step of priority is worth
+URGENCY_HORIZON_DAYS = 60  # Tasks due further out than this (or with no valid date) count as due this far out
+
+# Change export settings
+CHANGE_FORMATS = ("jsonl", "csv")
+CHANGE_FIELDS = ("change", "op", "name", "description", "priority", "due_date")  # CSV columns
+DELETION_LOG_SIZE = 100000  # Deleted task names remembered for export_changes
+
+
+# Pause the garbage collector while building lots of objects that all stay alive
+# (its collections would only walk them over and over)
+@contextmanager
+def gc_paused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Split text into its overlapping three-character substrings
+def get_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Get a task's urgency key on a day given as an ordinal (lower is more urgent). Days are counted
+# from a fixed origin instead of from today, so a new day only changes the keys of tasks due
+# beyond the horizon; subtract today to get the score itself.
+def get_urgency_key(task, today):
+    return task.priority_rank * URGENCY_PRIORITY_WEIGHT + min(task.date_ordinal, today + URGENCY_HORIZON_DAYS)
+
+
+# Normalize a sort key argument to a tuple of key names (empty for insertion order)
+def get_sort_keys(sort_key):
+    if sort_key is None:
+        return ()
+    return (sort_key,) if isinstance(sort_key, str) else tuple(sort_key)
+
+
+# Sort any list of tasks by one key or a tuple of keys using the cached sort keys
+def order_tasks(tasks, sort_key='name', reverse=False):
+    return sorted(tasks, key=attrgetter(*(SORT_KEY_ATTRIBUTES[key] for key in get_sort_keys(sort_key))),
+                  reverse=reverse)
+
+
+# Turn a cursor (a page's next_cursor: one value per sort key, then seq) into a tuple,
+# raising ValueError when it doesn't fit the sort keys
+def get_cursor_tuple(cursor, keys):
+    if cursor is None:
+        return None
+    cursor = tuple(cursor)
+    if len(cursor) != len(keys) + 1:
+        raise ValueError(f"cursor must hold {len(keys) + 1} value(s) for this sort")
+    return cursor
+
+
+# Check whether a row's (sort values..., seq) key comes after a cursor, in ascending order or,
+# with reverse, descending sort values and ascending seq (ties always keep insertion order)
+def is_after_cursor(row_key, cursor, reverse):
+    if not reverse:
+        return row_key > cursor
+    values, cursor_values = row_key[:-1], cursor[:-1]
+    return values < cursor_values or (values == cursor_values and row_key[-1] > cursor[-1])
+
+
+# Write change records to a file object as JSON Lines or as CSV with CHANGE_FIELDS as columns.
+# JSON Lines records are shaped like Stage 3's journal records plus their change number, and
+# "update" adds the task when the reader doesn't have it. A reset record (telling the reader
+# to drop every task it has) comes first when asked for, then the (change number, name) of
+# each deletion and then the tasks added or updated.
+def write_changes(file, file_format, reset, deletions, tasks):
+    if file_format == "csv":
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(CHANGE_FIELDS)
+        if reset:
+            writer.writerow(("", "reset", "", "", "", ""))
+        writer.writerows((change, "delete", name, "", "", "") for change, name in deletions)
+        writer.writerows((task.change_seq, "update", task.name, task.description, task.priority, task.due_date)
+                         for task in tasks)
+        return
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    if reset:
+        file.write(encode({"op": "reset"}) + "\n")
+    for change, name in deletions:
+        file.write(encode({"op": "delete", "name": name, "change": change}) + "\n")
+    for task in tasks:
+        file.write(encode({"op": "update", "task": task.to_dict(), "change": task.change_seq}) + "\n")
+
+
+class TaskPage:
+    # One page of a query: its tasks, how many tasks matched in total, and the cursor to pass
+    # back for the page after it (None once the last page has been returned)
+    __slots__ = ("tasks", "total", "next_cursor")
+
+    def __init__(self, tasks, total, next_cursor):
+        self.tasks = tasks
+        self.total = total
+        self.next_cursor = next_cursor
+
+
+class TaskVector:
+    # Immutable sequence of tasks stored as a list of tuple chunks. Changes return a new vector
+    # that shares every chunk they didn't touch, so each version costs a chunk list plus the
+    # chunks that changed, and a reader holding a version never sees it change underneath it.
+    __slots__ = ("chunks", "starts", "length")
+
+    def __init__(self, tasks=(), chunks=None):
+        if chunks is None:
+            tasks = tuple(tasks)
+            chunks = [tasks[i:i + VECTOR_CHUNK_SIZE] for i in range(0, len(tasks), VECTOR_CHUNK_SIZE)]
+        self.chunks = chunks
+        self.starts = list(accumulate(map(len, chunks), initial=0))  # Index of each chunk's first task, then the length
+        self.length = self.starts[-1]
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return chain.from_iterable(self.chunks)
+
+    def __reversed__(self):
+        return chain.from_iterable(map(reversed, reversed(self.chunks)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            rows = []
+            c = bisect.bisect_right(self.starts, start) - 1
+            while start < stop:
+                chunk_start = self.starts[c]
+                rows.extend(self.chunks[c][start - chunk_start:stop - chunk_start])
+                start = self.starts[c + 1]
+                c += 1
+            return rows
+        c, i = self.locate(index)
+        return self.chunks[c][i]
+
+    # Find the chunk holding an index and the position within it
+    def locate(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("task index out of range")
+        c = bisect.bisect_right(self.starts, index) - 1
+        return c, index - self.starts[c]
+
+    # Find the index of the task with a given seq (tasks are kept in seq order)
+    def index_of_seq(self, seq):
+        c = bisect.bisect_right(self.chunks, seq, key=lambda chunk: chunk[0].seq) - 1
+        i = bisect.bisect_left(self.chunks[c], seq, key=attrgetter('seq')) if c >= 0 else 0
+        if c < 0 or i == len(self.chunks[c]) or self.chunks[c][i].seq != seq:
+            raise ValueError(f"no task with seq {seq}")
+        return self.starts[c] + i
+
+    # Get a new vector with tasks added at the end (only the last chunk is copied)
+    def extended(self, tasks):
+        chunks = list(self.chunks)
+        last = list(chunks.pop()) if chunks else []
+        for task in tasks:
+            if len(last) == VECTOR_CHUNK_SIZE:
+                chunks.append(tuple(last))
+                last = []
+            last.append(task)
+        if last:
+            chunks.append(tuple(last))
+        return TaskVector(chunks=chunks)
+
+    # Get a new vector with the task at an index replaced
+    def replaced(self, index, task):
+        c, i = self.locate(index)
+        chunks = list(self.chunks)
+        chunks[c] = chunks[c][:i] + (task,) + chunks[c][i + 1:]
+        return TaskVector(chunks=chunks)
+
+    # Get a new vector without the task at an index (a chunk shrunk below half size is
+    # merged into the next one when they fit together, so deletes don't fragment the vector)
+    def deleted(self, index):
+        c, i = self.locate(index)
+        chunks = list(self.chunks)
+        chunk = chunks[c][:i] + chunks[c][i + 1:]
+        if c + 1 < len(chunks) and len(chunk) < VECTOR_CHUNK_SIZE // 2 and \
+                len(chunk) + len(chunks[c + 1]) <= VECTOR_CHUNK_SIZE:
+            chunk += chunks.pop(c + 1)
+        if chunk:
+            chunks[c] = chunk
+        else:
+            del chunks[c]
+        return TaskVector(chunks=chunks)
+
+
+class UrgencyQueue:
+    # Indexed binary min-heap of (urgency key, seq, task) entries for one day (see
+    # get_urgency_key), ties going to the task added first. positions maps each seq to its
+    # slot in the heap, so a task can be rescored or removed in O(log n) without a search.
+    __slots__ = ("heap", "positions", "today")
+
+    def __init__(self, tasks, today):
+        self.today = today
+        self.rebuild(tasks)
+
+    def __len__(self):
+        return len(self.heap)
+
+    # Get the most urgent task without removing it (None when the queue is empty)
+    def peek(self):
+        return self.heap[0][2] if self.heap else None
+
+    # Remove and return the most urgent task (None when the queue is empty)
+    def pop(self):
+        task = self.peek()
+        if task is not None:
+            self.discard(task)
+        return task
+
+    # Get the k most urgent tasks, most urgent first, by expanding the heap from its root
+    # (O(k log k), whatever the size of the queue)
+    def top_k(self, k):
+        heap = self.heap
+        found = []
+        frontier = [(heap[0], 0)] if heap and k > 0 else []
+        while frontier and len(found) < k:
+            entry, i = heapq.heappop(frontier)
+            found.append(entry[2])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return found
+
+    # Add a task
+    def push(self, task):
+        self.heap.append((get_urgency_key(task, self.today), task.seq, task))
+        self.sift_up(len(self.heap) - 1)
+
+    # Swap in a task for the queued one with the same seq and move it to its new place
+    def replace(self, task):
+        i = self.positions[task.seq]
+        old_key = self.heap[i][0]
+        self.heap[i] = entry = (get_urgency_key(task, self.today), task.seq, task)
+        if entry[0] < old_key:
+            self.sift_up(i)
+        else:
+            self.sift_down(i)
+
+    # Remove a task (nothing happens if it isn't queued)
+    def discard(self, task):
+        i = self.positions.pop(task.seq, None)
+        if i is None:
+            return
+        last = self.heap.pop()
+        if i < len(self.heap):
+            removed = self.heap[i]
+            self.heap[i] = last
+            if last < removed:
+                self.sift_up(i)
+            else:
+                self.sift_down(i)
+
+    # Move the queue to another day. Only the keys of the given tasks (those due beyond the
+    # earlier day's horizon) change: they are rescored one by one, or the whole heap is
+    # rebuilt when they are a large share of it.
+    def rescore(self, today, changed):
+        self.today = today
+        if len(changed) > len(self.heap) // SCAN_FRACTION:
+            self.rebuild([entry[2] for entry in self.heap])
+        else:
+            for task in changed:
+                self.replace(task)
+
+    # Score and heapify the given tasks from scratch in O(n)
+    def rebuild(self, tasks):
+        self.heap = [(get_urgency_key(task, self.today), task.seq, task) for task in tasks]
+        heapq.heapify(self.heap)
+        self.positions = {entry[1]: i for i, entry in enumerate(self.heap)}
+
+    # Move the entry at slot i towards the root until its parent is more urgent
+    def sift_up(self, i):
+        heap, positions = self.heap, self.positions
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent] < entry:
+                break
+            heap[i] = heap[parent]
+            positions[heap[i][1]] = i
+            i = parent
+        heap[i] = entry
+        positions[entry[1]] = i
+
+    # Move the entry at slot i towards the leaves until both children are less urgent
+    def sift_down(self, i):
+        heap, positions = self.heap, self.positions
+        entry = heap[i]
+        size = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if entry < heap[child]:
+                break
+            heap[i] = heap[child]
+            positions[heap[i][1]] = i
+            i = child
+        heap[i] = entry
+        positions[entry[1]] = i
+
+
 class TaskManager:
     # Initialize task manager with JSON file and load existing tasks
-    def __init__(self, json_file='tasks.json'):
+    # (set index_descriptions to also match name searches against descriptions,
+    # and load=False to start empty and feed tasks in with add_tasks)
+    def __init__(self, json_file='tasks.json', index_descriptions=False, load=True):
         self.json_file = json_file
-        self.tasks = []
-        self.load_tasks_from_json()
+        self.index_descriptions = index_descriptions
+        self.lock = threading.RLock()  # Held by every query and change so worker threads can read safely
+        self.tasks = TaskVector()  # Never changed in place: every change swaps in a new version
+        self.version = 0  # Bumped on every change, so (version, query) can key caches of results
+        self.trigram_index = {}  # lowercased trigram -> set of tasks
+        self.priority_index = {}  # priority -> set of tasks
+        self.due_date_index = {}  # due date string -> set of tasks
+        self.sorted_orders = {}  # sort key -> list of (key value, seq, task) kept sorted, also used for date ranges
+        self.unsorted_tasks = []  # Tasks add_tasks left out of the sort orders until one is next used
+        self.sorted_views = {}  # (sort key, reverse) -> cached list of tasks in that order
+        self.filter_cache = OrderedDict()  # (name, priority, due date) -> filtered tasks, least recent first
+        self.urgency_queue = None  # UrgencyQueue, built on first use and then kept in step with changes
+        self.name_index = {}  # lowercased name -> task, for applying journal records (Stage 3 keys tasks the same way)
+        self.file_signature = None  # Version of tasks.json last loaded (see get_file_signature)
+        self.journal_offset = 0  # Bytes of the Stage 3 journal already applied
+        self.store_lock = threading.RLock()  # Held by lock_store, separately from lock so reads go on meanwhile
+        self.store_lock_depth = 0
+        self.next_seq = 0
+        self.change_seq = 0  # Number of the latest change (each task holds the number of the last change to it)
+        self.deletions = deque()  # (change number, name) of recently deleted tasks, oldest first
+        self.delta_floor = 0  # export_changes answers an older since with a reset and every task
+        if load:
+            self.load_tasks_from_json()
+        else:
+            self.rebuild_indexes()
+
+    # Hold the advisory lock Stage 3 also uses for the store (tasks.json -> tasks.lock), exclusive
+    # for writes and shared for reads. Only the outermost call locks the file, so calls can nest
+    # (a shared lock must not be upgraded by nesting an exclusive one inside it). It doesn't hold
+    # the task lock, so queries aren't held up while a change is written out.
+    @contextmanager
+    def lock_store(self, exclusive=True):
+        with self.store_lock:
+            if self.store_lock_depth == 0 and fcntl is not None:
+                self.store_lock_file = open(os.path.splitext(self.json_file)[0] + ".lock", 'a')
+                fcntl.flock(self.store_lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self.store_lock_depth += 1
+            try:
+                yield
+            finally:
+                self.store_lock_depth -= 1
+                if self.store_lock_depth == 0 and fcntl is not None:
+                    self.store_lock_file.close()  # Closing releases the lock
 
-    # Load tasks from JSON file
+    # Load tasks from JSON file, then apply the changes Stage 3 has journaled since it was written
+    @instrumented('load')
     def load_tasks_from_json(self):
+        with self.lock_store(exclusive=False):
+            self.read_tasks_from_json()
+
+    # The body of load_tasks_from_json, run while holding the store lock. The file is read
+    # before taking the task lock, which is only held to swap the new tasks in.
+    def read_tasks_from_json(self):
+        signature = get_file_signature(self.json_file)
         try:
-            with open(self.json_file, 'r') as file:
-                data = json.load(file)
-                self.tasks = [Task(**task) for task in data]
+            tasks = list(iter_tasks_from_json(self.json_file))
         except FileNotFoundError:
-            self.tasks = []  # Start with empty list if file doesn't exist
+            tasks = []  # Start with empty list if file doesn't exist
         except json.JSONDecodeError:
             print("Error decoding JSON.")
-            self.tasks = []  # Start with empty list if JSON is invalid
+            tasks = []  # Start with empty list if JSON is invalid
+        with self.lock:
+            self.tasks = tasks
+            self.rebuild_indexes()
+            self.file_signature = signature
+            self.journal_offset = 0
+            self.apply_journal_changes()
 
-    # Filter tasks based on name, priority and due date
-    def get_filtered_tasks(self, name_filter=None, priority_filter=None, due_date_filter=None):
-        filtered = self.tasks
-        if name_filter and name_filter.strip():
-            filtered = [t for t in filtered if self.does_task_contain_name(t, name_filter)]
-        if priority_filter:
-            filtered = [t for t in filtered if t.priority == priority_filter]
-        if due_date_filter and due_date_filter.strip():
-            filtered = [t for t in filtered if t.due_date == due_date_filter]
-        return filtered
+    # Get the Stage 3 journal that goes with the JSON file
+    def get_journal_file(self):
+        return os.path.splitext(self.json_file)[0] + ".journal"
+
+    # Apply the journal records appended since the last call and return how many were applied
+    # (a record another process is still writing is left for the next call)
+    def apply_journal_changes(self):
+        try:
+            with open(self.get_journal_file(), 'rb') as file:
+                file.seek(self.journal_offset)
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        complete = data.rfind(b"\n") + 1
+        self.journal_offset += complete
+        applied = 0
+        with self.lock:
+            for line in data[:complete].splitlines():
+                try:
+                    self.apply_journal_record(json.loads(line))
+                    applied += 1
+                except (UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, AttributeError):
+                    print("Skipping a damaged journal record.")
+        return applied
+
+    # Append change records to the journal in one write with one fsync (call while holding the
+    # exclusive store lock, after refresh_if_changed, so the records land after everything applied)
+    def append_journal_records(self, records):
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode()
+        with open(self.get_journal_file(), 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+            end = file.tell()
+        if end - len(data) == self.journal_offset:
+            self.journal_offset = end  # Caught up already, so skip our own records on the next read
+
+    # Find a task by name, ignoring case (None if there is none)
+    def find_task(self, name):
+        return self.name_index.get(name.lower())
+
+    # Apply one Stage 3 journal record ({"op": "add"|"update", "task": {...}} or {"op": "delete", "name": ...})
+    def apply_journal_record(self, record):
+        if record["op"] == "delete":
+            task = self.find_task(record["name"])
+            if task is not None:
+                self.delete_task(task)
+            return
+        data = record["task"]
+        task = self.find_task(data["name"])
+        if task is None:
+            self.add_task(Task(data["name"], data["description"], data["priority"], data["due_date"]))
+        else:
+            self.update_task(task, data.get("description"), data.get("priority"), data.get("due_date"))
+
+    # Catch up with changes other processes saved: reload if tasks.json was replaced, otherwise
+    # apply only the new journal records. Returns True when the tasks changed.
+    def refresh_if_changed(self):
+        with self.lock_store(exclusive=False):
+            if get_file_signature(self.json_file) != self.file_signature:
+                self.read_tasks_from_json()  # Not load_tasks_from_json, so a save isn't also timed as a load
+                return True
+            return self.apply_journal_changes() > 0
+
+    # Replace the tasks with the contents of a binary snapshot
+    @instrumented('load')
+    def load_tasks_from_snapshot(self, snapshot_file):
+        with TaskSnapshot(snapshot_file) as snapshot:
+            tasks = list(snapshot.iter_tasks())
+        with self.lock:
+            self.tasks = tasks
+            self.rebuild_indexes()
+
+    # Map a binary snapshot for reading tasks on demand without loading them
+    def open_snapshot(self, snapshot_file):
+        return TaskSnapshot(snapshot_file)
+
+    # Save tasks in the json.dump(..., indent=4) layout. Saving to the manager's own file takes
+    # the store lock, folds in other processes' changes first, swaps the new file in atomically
+    # and empties the journal it now contains; any other path is simply written.
+    @instrumented('save')
+    def save_tasks_to_json(self, json_file=None):
+        if json_file is not None and json_file != self.json_file:
+            tasks = self.tasks  # This version, however the tasks change while it is written
+            with open(json_file, 'w') as file:
+                write_tasks_json(tasks, file)
+            return
+        with self.lock_store():
+            self.refresh_if_changed()
+            tasks = self.tasks  # This version is written without holding the task lock, so queries carry on
+            temp_file = f"{self.json_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as file:
+                write_tasks_json(tasks, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self.json_file)
+            self.file_signature = get_file_signature(self.json_file)
+            if os.path.exists(self.get_journal_file()):
+                open(self.get_journal_file(), 'w').close()
+            self.journal_offset = 0
+
+    # Write the current tasks to a binary snapshot
+    @instrumented('save')
+    def save_tasks_to_snapshot(self, snapshot_file):
+        write_snapshot(self.tasks, snapshot_file)
+
+    # Rebuild the priority and due date indexes from scratch
+    def rebuild_indexes(self):
+        with self.lock:
+            self.tasks = TaskVector(self.tasks)
+            self.trigram_index = {}
+            self.name_index = {}
+            self.priority_index = {}
+            self.due_date_index = {}
+            self.sorted_orders = {key: [] for key in SORT_KEY_ATTRIBUTES}
+            self.unsorted_tasks = []
+            self.urgency_queue = None
+            self.clear_query_caches()
+            if self.change_seq:
+                self.delta_floor = self.change_seq + 1  # What a reload changed isn't known
+            self.deletions.clear()
+            for task in self.tasks:
+                task.seq = self.next_seq
+                self.next_seq += 1
+                self.record_change(task)
+                self.index_task(task, keep_sort_orders=False)
+            # Sort each order once instead of inserting task by task
+            with gc_paused():
+                for key, attribute in SORT_KEY_ATTRIBUTES.items():
+                    get_value = attrgetter(attribute)
+                    self.sorted_orders[key] = sorted((get_value(t), t.seq, t) for t in self.tasks)
+
+    # Get the lowercased trigrams of a task's searchable text
+    def get_task_trigrams(self, task):
+        trigrams = get_trigrams(task.name.lower())
+        if self.index_descriptions:
+            trigrams |= get_trigrams(task.description.lower())
+        return trigrams
+
+    # Register a task in the trigram, priority and due date indexes and the sort orders
+    def index_task(self, task, keep_sort_orders=True):
+        for trigram in self.get_task_trigrams(task):
+            self.trigram_index.setdefault(trigram, set()).add(task)
+        self.name_index.setdefault(task.name.lower(), task)
+        self.priority_index.setdefault(task.priority, set()).add(task)
+        self.due_date_index.setdefault(task.due_date, set()).add(task)
+        if keep_sort_orders:
+            for key, attribute in SORT_KEY_ATTRIBUTES.items():
+                bisect.insort(self.sorted_orders[key], (getattr(task, attribute), task.seq, task))
+            self.clear_query_caches()
+
+    # Remove a task from the trigram, priority and due date indexes and the sort orders
+    def unindex_task(self, task):
+        for trigram in self.get_task_trigrams(task):
+            tasks_with_trigram = self.trigram_index.get(trigram)
+            if tasks_with_trigram is not None:
+                tasks_with_trigram.discard(task)
+                if not tasks_with_trigram:
+                    del self.trigram_index[trigram]
+        key = task.name.lower()
+        if self.name_index.get(key) is task:
+            del self.name_index[key]
+        tasks_with_priority = self.priority_index.get(task.priority)
+        if tasks_with_priority is not None:
+            tasks_with_priority.discard(task)
+            if not tasks_with_priority:
+                del self.priority_index[task.priority]
+        tasks_on_date = self.due_date_index.get(task.due_date)
+        if tasks_on_date is not None:
+            tasks_on_date.discard(task)
+            if not tasks_on_date:
+                del self.due_date_index[task.due_date]
+        for key, attribute in SORT_KEY_ATTRIBUTES.items():
+            order = self.get_sorted_order(key)
+            i = bisect.bisect_left(order, (getattr(task, attribute), task.seq))
+            if i < len(order) and order[i][2] is task:
+                del order[i]
+        self.clear_query_caches()
+
+    # Get the maintained order for one sort key, first merging in the tasks add_tasks left out
+    def get_sorted_order(self, sort_key):
+        with self.lock:
+            self.merge_unsorted_tasks()
+            return self.sorted_orders[sort_key]
+
+    # Merge the tasks add_tasks left out into every sort order
+    def merge_unsorted_tasks(self):
+        with self.lock:
+            if self.unsorted_tasks:
+                unsorted, self.unsorted_tasks = self.unsorted_tasks, []
+                with gc_paused():
+                    for key, attribute in SORT_KEY_ATTRIBUTES.items():
+                        get_value = attrgetter(attribute)
+                        order = self.sorted_orders[key]
+                        order.extend(sorted((get_value(t), t.seq, t) for t in unsorted))
+                        order.sort()  # Merges the two sorted runs in linear time
+
+    # Start a new version after the tasks change, forgetting cached sort views and filter results
+    def clear_query_caches(self):
+        self.version += 1
+        self.sorted_views = {}
+        self.filter_cache.clear()
+
+    # Give a task the next change number
+    def record_change(self, task):
+        self.change_seq += 1
+        task.change_seq = self.change_seq
+
+    # Add a new task and register it in the indexes
+    def add_task(self, task):
+        with self.lock:
+            task.seq = self.next_seq
+            self.next_seq += 1
+            self.record_change(task)
+            self.tasks = self.tasks.extended((task,))
+            self.index_task(task)
+            if self.urgency_queue is not None:
+                self.urgency_queue.push(task)
+
+    # Add a batch of tasks. They join the sort orders the next time one is used, so batches
+    # added back to back (as while loading) are merged in once instead of once per batch.
+    def add_tasks(self, tasks):
+        tasks = list(tasks)  # Walked more than once, so a generator must be read into a list first
+        with self.lock:
+            for task in tasks:
+                task.seq = self.next_seq
+                self.next_seq += 1
+                self.record_change(task)
+                self.index_task(task, keep_sort_orders=False)
+            self.tasks = self.tasks.extended(tasks)
+            self.unsorted_tasks.extend(tasks)
+            if self.urgency_queue is not None:
+                for task in tasks:
+                    self.urgency_queue.push(task)
+            self.clear_query_caches()
+
+    # Update the given fields of a task, keeping the indexes in step. The task is replaced
+    # by an updated copy (earlier versions keep the old one), which is returned. The task may
+    # come from an older version, so the current copy with the same seq is the one replaced.
+    def update_task(self, task, description=None, priority=None, due_date=None):
+        with self.lock:
+            index = self.tasks.index_of_seq(task.seq)
+            task = self.tasks[index]
+            updated = Task(task.name, task.description if description is None else description,
+                           task.priority if priority is None else priority,
+                           task.due_date if due_date is None else due_date)
+            updated.seq = task.seq
+            self.record_change(updated)
+            self.unindex_task(task)
+            self.tasks = self.tasks.replaced(index, updated)
+            self.index_task(updated)
+            if self.urgency_queue is not None:
+                self.urgency_queue.replace(updated)
+            return updated
+
+    # Delete a task and drop it from the indexes (the current copy, if task is from an older version)
+    def delete_task(self, task):
+        with self.lock:
+            index = self.tasks.index_of_seq(task.seq)
+            task = self.tasks[index]
+            self.tasks = self.tasks.deleted(index)
+            self.unindex_task(task)
+            if self.urgency_queue is not None:
+                self.urgency_queue.discard(task)
+            self.change_seq += 1
+            if len(self.deletions) == DELETION_LOG_SIZE:
+                self.delta_floor = self.deletions.popleft()[0]
+            self.deletions.append((self.change_seq, task.name))
+
+    # Get the current version number and its tasks. The tasks stay as they are however the
+    # manager changes afterwards, so they can be read without holding the lock.
+    def get_version(self):
+        with self.lock:
+            return self.version, self.tasks
+
+    # Write the tasks added, updated or deleted after change number since to a file object as
+    # JSON Lines or CSV (see write_changes) and return the number to pass as since next time.
+    # One version of the tasks is streamed out without holding the lock, so memory use doesn't
+    # grow with the store. The numbers belong to this manager: since=0 exports every task, and
+    # a since from before a reload, older than the deletion log or past the latest change (so
+    # handed out by another manager) gets a reset and every task.
+    def export_changes(self, file, since=0, file_format="jsonl"):
+        if file_format not in CHANGE_FORMATS:
+            raise ValueError(f"Unknown export format {file_format!r}, expected jsonl or csv")
+        with self.lock:
+            tasks, last = self.tasks, self.change_seq
+            reset = 0 < since and (since < self.delta_floor or since > last)
+            if reset:
+                since = 0
+            # Deletions only matter to a reader that has tasks already
+            deletions = list(takewhile(lambda deletion: deletion[0] > since, reversed(self.deletions))) if since else []
+        deletions.reverse()
+        write_changes(file, file_format, reset, deletions, (task for task in tasks if task.change_seq > since))
+        return last
+
+    # Filter tasks based on name, priority, due date and an inclusive (first, last) due date
+    # range of dates or YYYY-MM-DD strings, in insertion order or sorted by sort_key (see
+    # sort_tasks). The returned list is shared and must not be modified.
+    @instrumented('filter')
+    def get_filtered_tasks(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None,
+                           sort_key=None, reverse=False):
+        with self.lock:
+            filtered = self.get_filter_result(name_filter, priority_filter, due_date_filter, due_range)
+            if sort_key is None:
+                return filtered
+            if filtered is self.tasks:
+                return self.get_sorted_view(sort_key, reverse)
+            return order_tasks(filtered, sort_key, reverse)
+
+    # Get the tasks matching a filter in insertion order. Recent results are cached, and a query
+    # that narrows a cached one (e.g. "wat" -> "wate") refines that result instead of going back
+    # to the indexes.
+    def get_filter_result(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None):
+        with self.lock:
+            cache_key = self.get_filter_cache_key(name_filter, priority_filter, due_date_filter, due_range)
+            filtered = self.filter_cache.get(cache_key)
+            if filtered is not None:
+                self.filter_cache.move_to_end(cache_key)
+                if METRICS.enabled:
+                    METRICS.count('filter.cache_hits')
+                return filtered
+            base = self.get_refinable_result(cache_key)
+            if base is not None:
+                filtered = self.refine_filtered_tasks(base, cache_key)
+                if METRICS.enabled:
+                    METRICS.count('filter.refined')
+                    METRICS.count('filter.scanned', len(base))
+                    METRICS.count('filter.returned', len(filtered))
+            else:
+                filtered = self.search_filtered_tasks(name_filter, priority_filter, due_date_filter, cache_key[3])
+            self.filter_cache[cache_key] = filtered
+            if len(self.filter_cache) > FILTER_CACHE_SIZE:
+                self.filter_cache.popitem(last=False)
+            return filtered
+
+    # Normalize filter arguments to the (name, priority, due date, ordinal range) tuple the cache is keyed by
+    def get_filter_cache_key(self, name_filter, priority_filter, due_date_filter, due_range=None):
+        name = name_filter.lower() if name_filter and name_filter.strip() else None
+        due_date = due_date_filter if due_date_filter and due_date_filter.strip() else None
+        return name, priority_filter or None, due_date, get_ordinal_range(due_range)
+
+    # Find the smallest cached result that a query is guaranteed to be a subset of
+    # (None when only the unfiltered list qualifies, since the indexes beat a full scan)
+    def get_refinable_result(self, cache_key):
+        name, priority, due_date, ordinal_range = cache_key
+        best = None
+        for (cached_name, cached_priority, cached_due_date, cached_range), result in self.filter_cache.items():
+            if cached_priority not in (None, priority) or cached_due_date not in (None, due_date):
+                continue
+            if cached_range is not None and (ordinal_range is None or not (
+                    cached_range[0] <= ordinal_range[0] and ordinal_range[1] <= cached_range[1])):
+                continue
+            if cached_name is not None and (name is None or cached_name not in name):
+                continue
+            if result is self.tasks:
+                continue
+            if best is None or len(result) < len(best):
+                best = result
+        return best
+
+    # Check one task against a normalized filter (see get_filter_cache_key)
+    def task_matches_filter(self, task, cache_key):
+        name, priority, due_date, ordinal_range = cache_key
+        return ((priority is None or task.priority == priority) and (due_date is None or task.due_date == due_date)
+                and (ordinal_range is None or ordinal_range[0] <= task.date_ordinal <= ordinal_range[1])
+                and (name is None or self.does_task_contain_name(task, name)))
 
-    # Check if task name contains search term (case-insensitive)
+    # Narrow an earlier result (already in seq order) down to a more specific query
+    def refine_filtered_tasks(self, base, cache_key):
+        name, priority, due_date, ordinal_range = cache_key
+        refined = base
+        if priority is not None:
+            refined = [t for t in refined if t.priority == priority]
+        if due_date is not None:
+            refined = [t for t in refined if t.due_date == due_date]
+        if ordinal_range is not None:
+            first, last = ordinal_range
+            refined = [t for t in refined if first <= t.date_ordinal <= last]
+        if name is not None:
+            refined = [t for t in refined if self.does_task_contain_name(t, name)]
+        return refined if refined is not base else list(base)
+
+    # Filter tasks through the trigram, priority and due date indexes and the date order
+    # (ordinal_range is an inclusive pair of day ordinals)
+    def search_filtered_tasks(self, name_filter=None, priority_filter=None, due_date_filter=None,
+                              ordinal_range=None):
+        with self.lock:
+            # Collect candidate sets from the trigram, priority and due date indexes. A date range
+            # is a range of positions in the date order, so only its size is known up front.
+            candidate_sets = []
+            date_rows = None
+            if ordinal_range is not None:
+                date_rows = range(*self.get_date_order_bounds(*ordinal_range))
+                candidate_sets.append(date_rows)
+            if name_filter and name_filter.strip():
+                name_candidates = self.get_name_candidates(name_filter)
+                if name_candidates is not None:
+                    candidate_sets.append(name_candidates)
+            if priority_filter:
+                candidate_sets.append(self.priority_index.get(priority_filter, ()))
+            if due_date_filter and due_date_filter.strip():
+                candidate_sets.append(self.due_date_index.get(due_date_filter, ()))
+
+            candidate_sets.sort(key=len)
+            needs_ordering = False
+            if not candidate_sets:
+                filtered = self.tasks
+                scanned = len(filtered)
+            else:
+                if len(candidate_sets[0]) * SCAN_FRACTION > len(self.tasks):
+                    # Even the best index matches a large share of the store, so a scan is cheaper
+                    filtered = self.tasks
+                else:
+                    # Walk the most selective set and probe the others
+                    smallest = candidate_sets.pop(0)
+                    if smallest is date_rows:
+                        order = self.get_sorted_order('due_date')
+                        filtered = [entry[2] for entry in order[date_rows.start:date_rows.stop]]
+                    else:
+                        filtered = list(smallest)
+                    needs_ordering = True
+                scanned = len(filtered)
+                for tasks in candidate_sets:
+                    if tasks is date_rows:
+                        first, last = ordinal_range
+                        filtered = [t for t in filtered if first <= t.date_ordinal <= last]
+                    else:
+                        filtered = [t for t in filtered if t in tasks]
+
+            if name_filter and name_filter.strip():
+                filtered = [t for t in filtered if self.does_task_contain_name(t, name_filter)]
+
+            if needs_ordering:
+                filtered.sort(key=attrgetter('seq'))
+            if METRICS.enabled:
+                METRICS.count('filter.scanned', scanned)
+                METRICS.count('filter.returned', len(filtered))
+            return filtered
+
+    # Narrow a name search to the tasks sharing all of the term's trigrams
+    # (returns None for terms too short to have a trigram)
+    def get_name_candidates(self, search_term):
+        trigrams = get_trigrams(search_term.lower())
+        if not trigrams:
+            return None
+        posting_sets = []
+        for trigram in trigrams:
+            tasks_with_trigram = self.trigram_index.get(trigram)
+            if tasks_with_trigram is None:
+                return set()
+            posting_sets.append(tasks_with_trigram)
+        posting_sets.sort(key=len)
+        return posting_sets[0].intersection(*posting_sets[1:])
+
+    # Find the slice of the date order holding an inclusive range of day ordinals
+    def get_date_order_bounds(self, first, last):
+        order = self.get_sorted_order('due_date')
+        lo = bisect.bisect_left(order, (first,))
+        hi = bisect.bisect_left(order, (min(last, INVALID_DATE_ORDINAL - 1) + 1,))
+        return lo, max(lo, hi)
+
+    # Get tasks due within an inclusive range of day ordinals by bisecting the date order
+    # (tasks with invalid due dates never match)
+    def get_tasks_in_ordinal_range(self, first, last):
+        with self.lock:
+            lo, hi = self.get_date_order_bounds(first, last)
+            found = [entry[2] for entry in self.get_sorted_order('due_date')[lo:hi]]
+            found.sort(key=attrgetter('seq'))
+            return found
+
+    # Get tasks due between two dates or YYYY-MM-DD strings (inclusive)
+    def get_tasks_due_between(self, start_date, end_date):
+        return self.get_tasks_in_ordinal_range(*get_ordinal_range((start_date, end_date)))
+
+    # Get tasks due strictly before a date
+    def get_tasks_due_before(self, before_date):
+        return self.get_tasks_in_ordinal_range(0, get_bound_ordinal(before_date) - 1)
+
+    # Get tasks due strictly after a date
+    def get_tasks_due_after(self, after_date):
+        return self.get_tasks_in_ordinal_range(get_bound_ordinal(after_date) + 1, INVALID_DATE_ORDINAL - 1)
+
+    # Get tasks whose due date has passed (today defaults to the current date)
+    def get_overdue_tasks(self, today=None):
+        return self.get_tasks_due_before(today or date.today())
+
+    # Get tasks due from today through the given number of days ahead
+    def get_tasks_due_within_days(self, days, today=None):
+        first = get_bound_ordinal(today or date.today())
+        return self.get_tasks_in_ordinal_range(first, first + days)
+
+    # Get the urgency queue for a day (today by default), building it on first use. Moving to
+    # another day only rescores the tasks due beyond the earlier day's horizon.
+    def get_urgency_queue(self, today=None):
+        today = get_bound_ordinal(today or date.today())
+        with self.lock:
+            if self.urgency_queue is None:
+                self.urgency_queue = UrgencyQueue(self.tasks, today)
+            elif self.urgency_queue.today != today:
+                order = self.get_sorted_order('due_date')
+                start = bisect.bisect_left(order, (min(self.urgency_queue.today, today) + URGENCY_HORIZON_DAYS + 1,))
+                self.urgency_queue.rescore(today, [entry[2] for entry in order[start:]])
+            return self.urgency_queue
+
+    # Get the k most urgent tasks by priority and days until due, most urgent first
+    def get_next_tasks(self, k=NEXT_TASK_COUNT, today=None):
+        with self.lock:
+            return self.get_urgency_queue(today).top_k(k)
+
+    # Get the most urgent task (None when there are no tasks)
+    def peek_next_task(self, today=None):
+        with self.lock:
+            return self.get_urgency_queue(today).peek()
+
+    # Take the most urgent task off the list (it's done) and return it (None when there are no tasks)
+    def pop_next_task(self, today=None):
+        with self.lock:
+            task = self.get_urgency_queue(today).pop()
+            if task is not None:
+                self.delete_task(task)
+            return task
+
+    # Check if task name (or description, when indexed) contains search term (case-insensitive)
     def does_task_contain_name(self, task, search_term):
-        return search_term.lower() in task.name.lower()
-
-    # Sort tasks by specified key (name, priority or due_date)
-    def sort_tasks(self, sort_key='name'):
-        if sort_key == 'name':
-            self.tasks.sort(key=self.get_name_for_sorting)
-        elif sort_key == 'priority':
-            self.tasks.sort(key=self.get_priority_for_sorting)
-        elif sort_key == 'due_date':
-            self.tasks.sort(key=self.get_date_for_sorting)
-
-    # Get name for sorting (converts to lowercase for case-insensitive sorting)
+        search_term = search_term.lower()
+        if search_term in task.name.lower():
+            return True
+        return self.index_descriptions and search_term in task.description.lower()
+
+    # Get all tasks ordered by a key (name, priority or due_date) or a tuple of keys
+    # such as ('priority', 'due_date'); ties keep insertion order. self.tasks is left
+    # untouched and the returned list is a shared view that callers must not modify.
+    @instrumented('sort')
+    def sort_tasks(self, sort_key='name', reverse=False):
+        return self.get_sorted_view(sort_key, reverse)
+
+    # The body of sort_tasks, which other queries call without timing it as a sort of its own
+    def get_sorted_view(self, sort_key='name', reverse=False):
+        with self.lock:
+            if not isinstance(sort_key, str):
+                sort_key = tuple(sort_key)
+            view = self.sorted_views.get((sort_key, reverse))
+            if view is None:
+                if isinstance(sort_key, str):
+                    view = self.get_single_key_view(sort_key, reverse)
+                else:
+                    view = order_tasks(self.tasks, sort_key, reverse)
+                self.sorted_views[(sort_key, reverse)] = view
+            return view
+
+    # Read a presorted view off the maintained order for a single key
+    def get_single_key_view(self, sort_key, reverse):
+        order = self.get_sorted_order(sort_key)
+        if not reverse:
+            return [entry[2] for entry in order]
+        # Walk the order backwards but keep equal keys in insertion order
+        view = []
+        for _, entries in groupby(reversed(order), key=itemgetter(0)):
+            view.extend(entry[2] for entry in reversed(list(entries)))
+        return view
+
+    # Sort any list of tasks by one key or a tuple of keys (see order_tasks, which the
+    # manager's own queries call so they aren't timed as a sort as well)
+    @instrumented('sort')
+    def sort_task_list(self, tasks, sort_key='name', reverse=False):
+        return order_tasks(tasks, sort_key, reverse)
+
+    # Get one page of a filtered, sorted query. Pages are picked by offset, by cursor (the
+    # next_cursor of the previous page, which stays valid while tasks change), or both.
+    # Only offset + limit rows are ever ordered: single-key queries matching most tasks walk the
+    # maintained sort order from the cursor, anything else selects its rows with a heap.
+    def get_task_page(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None,
+                      sort_key=None, reverse=False, limit=DEFAULT_PAGE_SIZE, offset=0, cursor=None):
+        keys = get_sort_keys(sort_key)
+        get_row_key = attrgetter(*(SORT_KEY_ATTRIBUTES[key] for key in keys), 'seq')
+        cursor = get_cursor_tuple(cursor, keys)
+        wanted = offset + limit if limit is not None else None
+        with self.lock:
+            filtered = self.get_filter_result(name_filter, priority_filter, due_date_filter, due_range)
+            total = len(filtered)
+            if not keys:
+                rows = self.get_insertion_order_page(filtered, reverse, cursor, offset, limit)
+            elif len(keys) == 1 and (filtered is self.tasks or
+                                     wanted is not None and total * SCAN_FRACTION > len(self.tasks)):
+                # Most tasks match, so walking the maintained order fills the page quickly
+                rows = self.iter_sort_order(keys[0], reverse, cursor)
+                if filtered is not self.tasks:
+                    cache_key = self.get_filter_cache_key(name_filter, priority_filter, due_date_filter, due_range)
+                    rows = (t for t in rows if self.task_matches_filter(t, cache_key))
+                rows = list(islice(rows, offset, wanted))
+            else:
+                if cursor is not None:
+                    filtered = [t for t in filtered if is_after_cursor(get_row_key(t), cursor, reverse)]
+                if wanted is None:
+                    rows = order_tasks(filtered, keys, reverse)[offset:]
+                else:
+                    # The heap keeps ties in list order, and filtered lists are in insertion order
+                    select = heapq.nlargest if reverse else heapq.nsmallest
+                    rows = select(wanted, filtered, key=attrgetter(*(SORT_KEY_ATTRIBUTES[key] for key in keys)))
+                    rows = rows[offset:]
+            next_cursor = None
+            if rows and limit is not None and len(rows) == limit:
+                next_cursor = get_row_key(rows[-1]) if keys else (rows[-1].seq,)
+            return TaskPage(rows, total, next_cursor)
+
+    # Slice a page out of a result kept in insertion order, starting just after a cursor (newest
+    # first with reverse). The cursor is found by bisecting on seq.
+    def get_insertion_order_page(self, tasks, reverse, cursor, offset, limit):
+        get_seq = attrgetter('seq')
+        if not reverse:
+            start = offset if cursor is None else bisect.bisect_right(tasks, cursor[-1], key=get_seq) + offset
+            return tasks[start:None if limit is None else start + limit]
+        end = len(tasks) if cursor is None else bisect.bisect_left(tasks, cursor[-1], key=get_seq)
+        end -= offset
+        if end <= 0:
+            return []
+        return tasks[0 if limit is None else max(0, end - limit):end][::-1]
+
+    # Walk the maintained order for one sort key from just after a cursor, descending with
+    # reverse (equal keys still come out in insertion order either way)
+    def iter_sort_order(self, sort_key, reverse, cursor=None):
+        order = self.get_sorted_order(sort_key)
+        if not reverse:
+            start = 0 if cursor is None else bisect.bisect_left(order, (cursor[0], cursor[1] + 1))
+            for i in range(start, len(order)):
+                yield order[i][2]
+            return
+        end = len(order)
+        if cursor is not None:
+            value, seq = cursor
+            # Finish the cursor's group of equal keys, then carry on with the smaller keys
+            for i in range(bisect.bisect_left(order, (value, seq + 1)), bisect.bisect_left(order, (value, float('inf')))):
+                yield order[i][2]
+            end = bisect.bisect_left(order, (value,))
+        while end > 0:
+            start = bisect.bisect_left(order, (order[end - 1][0],), 0, end)
+            for i in range(start, end):
+                yield order[i][2]
+            end = start
+
+    # Lazily iterate over every task a query matches, fetching a page at a time by cursor so
+    # the lock is only held per page (later pages double in size to keep heap selection cheap)
+    def iter_tasks(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None,
+                   sort_key=None, reverse=False, cursor=None, page_size=ITER_PAGE_SIZE):
+        while True:
+            page = self.get_task_page(name_filter, priority_filter, due_date_filter, due_range,
+                                      sort_key, reverse, page_size, 0, cursor)
+            yield from page.tasks
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+            page_size *= 2
+
+    # Get name for sorting (casefolded for case-insensitive sorting)
     def get_name_for_sorting(self, task):
-        return task.name.lower()
+        return task.sort_name
 
     # Get priority value for sorting (High=1, Medium=2, Low=3)
     def get_priority_for_sorting(self, task):
-        priority_values = {'High': 1, 'Medium': 2, 'Low': 3}
-        return priority_values.get(task.priority, 4)
+        return task.priority_rank
 
-    # Get date as datetime object for proper date sorting
+    # Get date as a day ordinal for proper date sorting
     def get_date_for_sorting(self, task):
-        return datetime.strptime(task.due_date, "%Y-%m-%d")
+        return task.date_ordinal
 
 
-class TaskManagerGUI:
-    # Initialize the GUI window and task manager
+# SQL columns holding the cached sort key for each sortable column
+SQL_SORT_COLUMNS = {'name': 'sort_name', 'priority': 'priority_rank', 'due_date': 'date_ordinal'}
+SQL_TASK_COLUMNS = "seq, name, description, priority, due_date, date_ordinal, change_seq"
+SQL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    due_date TEXT NOT NULL,
+    sort_name TEXT NOT NULL,
+    priority_rank INTEGER NOT NULL,
+    date_ordinal INTEGER NOT NULL,
+    change_seq INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (priority);
+CREATE INDEX IF NOT EXISTS tasks_due_date ON tasks (due_date);
+CREATE INDEX IF NOT EXISTS tasks_sort_name ON tasks (sort_name, seq);
+CREATE INDEX IF NOT EXISTS tasks_priority_rank ON tasks (priority_rank, seq);
+CREATE INDEX IF NOT EXISTS tasks_date_ordinal ON tasks (date_ordinal, seq);
+"""
+# Change tracking for export_changes: the change_seq index (created once databases from before
+# the column have had it added) and the names of deleted tasks with their change numbers
+SQL_CHANGES_SCHEMA = """
+CREATE INDEX IF NOT EXISTS tasks_change_seq ON tasks (change_seq);
+CREATE TABLE IF NOT EXISTS deleted_tasks (
+    change_seq INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+"""
+SQL_LAST_CHANGE = ("SELECT MAX((SELECT IFNULL(MAX(change_seq), 0) FROM tasks),"
+                   " (SELECT IFNULL(MAX(change_seq), 0) FROM deleted_tasks))")
+# Full-text index over names and descriptions using SQLite's trigram tokenizer (SQLite 3.34+)
+SQL_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    name, description, content='tasks', content_rowid='seq', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, name, description) VALUES (new.seq, new.name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, name, description) VALUES ('delete', old.seq, old.name, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, name, description) VALUES ('delete', old.seq, old.name, old.description);
+    INSERT INTO tasks_fts (rowid, name, description) VALUES (new.seq, new.name, new.description);
+END;
+"""
+SQL_BATCH_SIZE = 10000  # Rows inserted per transaction when migrating
+
+
+# Turn a result row into a Task
+def task_from_row(row):
+    seq, name, description, priority, due_date, date_ordinal, change_seq = row
+    task = Task(name, description, priority, due_date, date_ordinal)
+    task.seq = seq
+    task.change_seq = change_seq
+    return task
+
+
+# Build the ORDER BY clause for a sort key or tuple of keys (ties keep insertion order, as in sort_tasks)
+def get_sql_order_by(sort_key, reverse=False):
+    if isinstance(sort_key, str):
+        sort_key = (sort_key,)
+    direction = " DESC" if reverse else ""
+    return ", ".join(SQL_SORT_COLUMNS[key] + direction for key in sort_key) + ", seq"
+
+
+class SqliteTaskRows:
+    # Lazily evaluated, ordered query result: len() runs a COUNT and slices fetch
+    # just the requested rows, so the table can page through stores larger than RAM
+    def __init__(self, manager, where="", params=(), order_by="seq"):
+        self.manager = manager
+        self.where = where
+        self.params = tuple(params)
+        self.order_by = order_by
+        self.count = None
+
+    def __len__(self):
+        if self.count is None:
+            query = f"SELECT COUNT(*) FROM tasks {self.where}"
+            with self.manager.lock:
+                self.count = self.manager.connection.execute(query, self.params).fetchone()[0]
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return self.fetch(max(0, stop - start), start)
+        if index < 0:
+            index += len(self)
+        rows = self.fetch(1, index)
+        if not rows:
+            raise IndexError("task row out of range")
+        return rows[0]
+
+    def __iter__(self):
+        return iter(self.fetch(-1, 0))
+
+    # Fetch up to limit tasks starting at offset (limit -1 means no limit)
+    def fetch(self, limit, offset):
+        query = (f"SELECT {SQL_TASK_COLUMNS} FROM tasks {self.where} "
+                 f"ORDER BY {self.order_by} LIMIT ? OFFSET ?")
+        with self.manager.lock:
+            rows = self.manager.connection.execute(query, self.params + (limit, offset)).fetchall()
+        return [task_from_row(row) for row in rows]
+
+
+class SqliteTaskManager(TaskManager):
+    # Task manager backed by a SQLite database instead of tasks.json. Filtering and
+    # sorting run as indexed SQL queries, so tasks are only loaded when they are shown.
+    # (the in-memory indexes of TaskManager are not used, so its initializer isn't called)
+    def __init__(self, db_file='tasks.db', index_descriptions=False):
+        import sqlite3
+        self.json_file = None
+        self.index_descriptions = index_descriptions
+        self.lock = threading.RLock()  # The connection is shared with the query worker thread
+        self.version = 0
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SQL_SCHEMA)
+        if "change_seq" not in {column[1] for column in self.connection.execute("PRAGMA table_info(tasks)")}:
+            self.connection.execute("ALTER TABLE tasks ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 1")
+        self.connection.executescript(SQL_CHANGES_SCHEMA)
+        try:
+            self.connection.executescript(SQL_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False  # No FTS5 trigram tokenizer; name search falls back to a scan
+        # Case-insensitive substring test with the same semantics as does_task_contain_name
+        self.connection.create_function(
+            "contains_text", 2, lambda text, term: term in text.lower(), deterministic=True)
+
+    # All tasks in insertion order, fetched on demand
+    @property
+    def tasks(self):
+        return SqliteTaskRows(self)
+
+    # Get the number of the latest change saved to the database (read inside a write's
+    # transaction, so changes other connections saved are counted too)
+    def get_last_change(self):
+        return self.connection.execute(SQL_LAST_CHANGE).fetchone()[0]
+
+    # Column values stored for a task
+    def get_row_values(self, task):
+        return (task.name, task.description, task.priority, task.due_date,
+                task.sort_name, task.priority_rank, task.date_ordinal)
+
+    # Add a new task
+    def add_task(self, task):
+        self.add_tasks([task])
+
+    # Add a batch of tasks in one transaction
+    def add_tasks(self, tasks):
+        with self.lock:
+            with self.connection:
+                change_seq = self.get_last_change()
+                for task in tasks:
+                    change_seq += 1
+                    cursor = self.connection.execute(
+                        "INSERT INTO tasks (name, description, priority, due_date, sort_name, priority_rank, date_ordinal,"
+                        " change_seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self.get_row_values(task) + (change_seq,))
+                    task.seq = cursor.lastrowid
+                    task.change_seq = change_seq
+            self.version += 1
+
+    # Update the given fields of a task (rows are fetched as fresh objects, so it is updated in place)
+    def update_task(self, task, description=None, priority=None, due_date=None):
+        with self.lock:
+            if description is not None:
+                task.description = description
+            if priority is not None:
+                task.priority = priority
+            if due_date is not None:
+                task.due_date = due_date
+            task.refresh_sort_keys()
+            with self.connection:
+                task.change_seq = self.get_last_change() + 1
+                self.connection.execute(
+                    "UPDATE tasks SET name = ?, description = ?, priority = ?, due_date = ?, sort_name = ?,"
+                    " priority_rank = ?, date_ordinal = ?, change_seq = ? WHERE seq = ?",
+                    self.get_row_values(task) + (task.change_seq, task.seq))
+            self.version += 1
+            return task
+
+    # Delete a task
+    def delete_task(self, task):
+        with self.lock:
+            with self.connection:
+                self.connection.execute("INSERT INTO deleted_tasks (change_seq, name) VALUES (?, ?)",
+                                        (self.get_last_change() + 1, task.name))
+                self.connection.execute("DELETE FROM tasks WHERE seq = ?", (task.seq,))
+            self.version += 1
+
+    # Filter tasks based on name, priority, due date and due date range with an indexed query,
+    # sorted by sort_key in the query itself. The result is lazy like tasks: only the rows read
+    # from it are fetched.
+    @instrumented('filter')
+    def get_filtered_tasks(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None,
+                           sort_key=None, reverse=False):
+        conditions, params = self.get_filter_conditions(name_filter, priority_filter, due_date_filter, due_range)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        order_by = "seq" if sort_key is None else get_sql_order_by(sort_key, reverse)
+        return SqliteTaskRows(self, where, params, order_by)
+
+    # Build the SQL conditions and parameters for a filter
+    def get_filter_conditions(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None):
+        conditions = []
+        params = []
+        if name_filter and name_filter.strip():
+            term = name_filter.lower()
+            columns = "name, description" if self.index_descriptions else "name"
+            if self.has_fts and len(term) >= 3:
+                # Narrow with the trigram index, then confirm with the exact substring test
+                conditions.append("seq IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+                params.append("{%s} : \"%s\"" % (columns.replace(",", ""), term.replace('"', '""')))
+            checks = " OR ".join(f"contains_text({column}, ?)" for column in columns.split(", "))
+            conditions.append(f"({checks})")
+            params.extend([term] * len(columns.split(", ")))
+        if priority_filter:
+            conditions.append("priority = ?")
+            params.append(priority_filter)
+        if due_date_filter and due_date_filter.strip():
+            conditions.append("due_date = ?")
+            params.append(due_date_filter)
+        if due_range is not None:
+            conditions.append("date_ordinal BETWEEN ? AND ?")
+            params.extend(get_ordinal_range(due_range))
+        return conditions, params
+
+    # Get one page of a filtered, sorted query with LIMIT/OFFSET, seeking past a cursor with a
+    # keyset condition so the sort indexes are used instead of skipping rows
+    def get_task_page(self, name_filter=None, priority_filter=None, due_date_filter=None, due_range=None,
+                      sort_key=None, reverse=False, limit=DEFAULT_PAGE_SIZE, offset=0, cursor=None):
+        keys = get_sort_keys(sort_key)
+        columns = [SQL_SORT_COLUMNS[key] for key in keys]
+        direction = " DESC" if reverse else ""
+        order_by = ", ".join([column + direction for column in columns] + ["seq" + (direction if not keys else "")])
+        cursor = get_cursor_tuple(cursor, keys)
+        conditions, params = self.get_filter_conditions(name_filter, priority_filter, due_date_filter, due_range)
+        total = len(SqliteTaskRows(self, "WHERE " + " AND ".join(conditions) if conditions else "", params))
+        if cursor is not None:
+            # Rows after (values..., seq): equal on a prefix of the columns, then past the cursor on the next one
+            alternatives = []
+            for i, column in enumerate(columns + ["seq"]):
+                after = "<" if reverse and (column != "seq" or not keys) else ">"
+                alternatives.append(" AND ".join([f"{c} = ?" for c in columns[:i]] + [f"{column} {after} ?"]))
+                params = params + list(cursor[:i + 1])
+            conditions = conditions + ["(" + " OR ".join(alternatives) + ")"]
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = SqliteTaskRows(self, where, params, order_by).fetch(-1 if limit is None else limit, offset)
+        next_cursor = None
+        if rows and limit is not None and len(rows) == limit:
+            next_cursor = tuple(getattr(rows[-1], SORT_KEY_ATTRIBUTES[key]) for key in keys) + (rows[-1].seq,)
+        return TaskPage(rows, total, next_cursor)
+
+    # Get tasks due within an inclusive range of day ordinals through the date_ordinal index
+    def get_tasks_in_ordinal_range(self, first, last):
+        last = min(last, INVALID_DATE_ORDINAL - 1)
+        return list(SqliteTaskRows(self, "WHERE date_ordinal BETWEEN ? AND ?", (first, last)))
+
+    # Get all tasks ordered by a key or tuple of keys, as a lazy result read through the sort indexes
+    @instrumented('sort')
+    def sort_tasks(self, sort_key='name', reverse=False):
+        return SqliteTaskRows(self, order_by=get_sql_order_by(sort_key, reverse))
+
+    # Write the tasks added, updated or deleted after change number since (see
+    # TaskManager.export_changes). The numbers are kept in the database, so they stay valid
+    # across processes, and rows are streamed from the query cursors.
+    def export_changes(self, file, since=0, file_format="jsonl"):
+        if file_format not in CHANGE_FORMATS:
+            raise ValueError(f"Unknown export format {file_format!r}, expected jsonl or csv")
+        with self.lock:
+            last = self.get_last_change()
+            deletions = self.connection.execute(
+                "SELECT change_seq, name FROM deleted_tasks WHERE change_seq > ? AND change_seq <= ? ORDER BY change_seq",
+                (since, last)) if since else ()
+            rows = self.connection.execute(
+                f"SELECT {SQL_TASK_COLUMNS} FROM tasks WHERE change_seq > ? AND change_seq <= ? ORDER BY seq", (since, last))
+            write_changes(file, file_format, False, deletions, map(task_from_row, rows))
+        return last
+
+    # Get the k most urgent tasks with one query ordered by the urgency key (see get_urgency_key)
+    def get_next_tasks(self, k=NEXT_TASK_COUNT, today=None):
+        today = get_bound_ordinal(today or date.today())
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {SQL_TASK_COLUMNS} FROM tasks ORDER BY priority_rank * ? + MIN(date_ordinal, ?), seq LIMIT ?",
+                (URGENCY_PRIORITY_WEIGHT, today + URGENCY_HORIZON_DAYS, k)).fetchall()
+        return [task_from_row(row) for row in rows]
+
+    # Get the most urgent task (None when there are no tasks)
+    def peek_next_task(self, today=None):
+        tasks = self.get_next_tasks(1, today)
+        return tasks[0] if tasks else None
+
+    # Take the most urgent task off the list (it's done) and return it (None when there are no tasks)
+    def pop_next_task(self, today=None):
+        with self.lock:
+            task = self.peek_next_task(today)
+            if task is not None:
+                self.delete_task(task)
+            return task
+
+    # Close the database connection
+    def close(self):
+        self.connection.close()
+
+
+# Copy every task from a .json or .txt file into a SQLite database, in batched transactions
+def migrate_to_sqlite(source_file, db_file):
+    readers = {'.json': iter_tasks_from_json, '.txt': iter_tasks_from_txt}
+    source_type = os.path.splitext(source_file)[1]
+    if source_type not in readers:
+        raise ValueError("Source file must end in .json or .txt")
+    manager = SqliteTaskManager(db_file)
+    migrated = 0
+    batch = []
+    for task in readers[source_type](source_file):
+        batch.append(task)
+        if len(batch) >= SQL_BATCH_SIZE:
+            manager.add_tasks(batch)
+            migrated += len(batch)
+            batch = []
+    manager.add_tasks(batch)
+    migrated += len(batch)
+    manager.close()
+    print(f"Migrated {migrated} tasks from {source_file} to {db_file}.")
+
+
+class QueryWorker:
+    # Runs filter and sort queries on a worker thread so the Tk main loop never blocks.
+    # Only the newest query counts: queued queries it supersedes are skipped and late
+    # results are dropped. Results are handed back on the Tk thread by polling with root.after.
     def __init__(self, root):
+        self.root = root
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.latest_id = 0  # Id of the newest submitted query
+        self.polling = False
+        threading.Thread(target=self.run_queries, daemon=True).start()
+
+    # Queue a query (a function with no arguments); on_done(result) runs on the Tk thread
+    def submit(self, query, on_done):
+        self.latest_id += 1
+        self.requests.put((self.latest_id, query, on_done))
+        if not self.polling:
+            self.polling = True
+            self.root.after(QUERY_POLL_MS, self.poll_results)
+
+    # Check whether a query is still waiting for its result
+    def is_busy(self):
+        return self.polling
+
+    # Worker thread loop
+    def run_queries(self):
+        while True:
+            query_id, query, on_done = self.requests.get()
+            if query_id != self.latest_id:
+                continue  # Superseded before it started
+            try:
+                result = query()
+            except Exception as e:
+                print(f"Query failed: {e}")
+                on_done = None
+                result = None
+            self.results.put((query_id, result, on_done))
+
+    # Deliver the newest query's result on the Tk thread
+    def poll_results(self):
+        while True:
+            try:
+                query_id, result, on_done = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if query_id == self.latest_id:
+                self.polling = False
+                if on_done is not None:
+                    on_done(result)
+                return
+        self.root.after(QUERY_POLL_MS, self.poll_results)
+
+
+class TaskManagerGUI:
+    # Initialize the GUI window and task manager (tasks.json is loaded in the
+    # background unless a ready task manager, such as a SqliteTaskManager, is passed in).
+    # With snapshot_cache the load reads a binary snapshot kept next to tasks.json instead
+    # whenever it is up to date, and writes a new one after reading the JSON otherwise.
+    def __init__(self, root, task_manager=None, snapshot_cache=False):
+        import_tkinter()
         self.root = root
         self.root.title("Personal Task Manager")
-        self.task_manager = TaskManager()
+        self.task_manager = task_manager or TaskManager(load=False)
+        self.load_queue = queue.Queue()  # True after each batch the loader thread adds, None once it is done
+        self.loading = task_manager is None
+        self.snapshot_cache = snapshot_cache
+        self.sort_key = None  # Column the table is currently sorted by
+        self.sort_reverse = False
+        self.query_worker = QueryWorker(self.root)
+        self.change_worker = QueryWorker(self.root)  # Checks the task store for other processes' changes
+        self.init_table_state()
         self.setup_gui()
         self.populate_tree()
         self.setup_sort_buttons()
+        if task_manager is None:
+            self.start_background_load()
+        else:
+            self.refresh_next_tasks()
+
+    # Load tasks.json on a worker thread so the window can show the first rows straight away
+    def start_background_load(self):
+        self.task_manager.file_signature = get_file_signature(self.task_manager.json_file)
+        threading.Thread(target=self.load_tasks_in_background, daemon=True).start()
+        self.root.after(LOAD_POLL_MS, self.poll_loaded_tasks)
+
+    # Parse tasks on the worker thread and queue them in batches
+    # (the first batch is one screenful so it can be drawn immediately)
+    def load_tasks_in_background(self):
+        json_file = self.task_manager.json_file
+        signature = self.task_manager.file_signature
+        cache_file = get_snapshot_cache_file(json_file) if self.snapshot_cache else None
+        loaded = None
+        try:
+            if cache_file and is_snapshot_cache_fresh(cache_file, signature):
+                try:
+                    snapshot = TaskSnapshot(cache_file)
+                except (OSError, ValueError) as e:
+                    print(f"Ignoring snapshot cache: {e}")
+                else:
+                    with snapshot:
+                        self.add_task_batches(snapshot.iter_tasks())
+                    return
+            loaded = [] if cache_file else None
+            try:
+                self.add_task_batches(iter_tasks_from_json(json_file), loaded)
+            except FileNotFoundError:
+                loaded = None  # Start with an empty list if the file doesn't exist
+            except json.JSONDecodeError:
+                print("Error decoding JSON.")
+                with self.task_manager.lock:
+                    self.task_manager.tasks = []  # Start with an empty list if JSON is invalid
+                    self.task_manager.rebuild_indexes()
+                self.load_queue.put(True)
+                loaded = None
+        finally:
+            self.load_queue.put(None)  # Even after an unexpected error, so the window stops "Loading…"
+        if loaded is not None:
+            try:
+                write_snapshot_cache(loaded, cache_file, signature)
+            except OSError as e:
+                print(f"Could not write snapshot cache: {e}")
+
+    # Add tasks to the task manager in batches on this (the loader) thread, so the indexing
+    # never runs on the Tk thread, and tell the Tk thread after each one. Tasks are also
+    # collected into loaded when it is given.
+    def add_task_batches(self, tasks, loaded=None):
+        batch = []
+        batch_size = VISIBLE_ROWS + ROW_BUFFER
+        for task in tasks:
+            batch.append(task)
+            if len(batch) >= batch_size:
+                self.add_task_batch(batch, loaded)
+                batch = []
+                batch_size = LOAD_BATCH_SIZE
+        self.add_task_batch(batch, loaded)
+        self.task_manager.merge_unsorted_tasks()  # Here rather than on the first sort or edit
+
+    # Add one batch of loaded tasks and tell the Tk thread a new version is ready
+    def add_task_batch(self, batch, loaded):
+        self.task_manager.add_tasks(batch)
+        if loaded is not None:
+            loaded.extend(batch)
+        self.load_queue.put(True)
+
+    # Show the newest version of the tasks the loader thread has added to on the Tk thread
+    def poll_loaded_tasks(self):
+        done = False
+        loaded = False
+        while not done:
+            try:
+                message = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                done = True
+                self.loading = False
+            else:
+                loaded = True
+
+        showing_all = self.showing_all
+        if loaded and showing_all:
+            self.rows = self.task_manager.tasks  # The version with the newest batch in it
+            self.render_rows()
+        if not done:
+            self.set_status(f"Loading… {len(self.task_manager.tasks)} tasks")
+            self.root.after(LOAD_POLL_MS, self.poll_loaded_tasks)
+            return
+        if not showing_all:
+            self.apply_filter()  # Re-run the user's filter and sort over the complete list
+        else:
+            self.set_status("")
+        self.refresh_next_tasks()
+        self.watch_for_changes()  # Catch up with changes saved while loading, on the change worker
+
+    # Pick up changes other processes save to the task store and refresh the table (and the
+    # "Next up" panel, which also changes when the day does). The check waits for the store
+    # lock and may reload tasks.json, so it runs on a worker thread.
+    def watch_for_changes(self):
+        self.change_worker.submit(self.check_for_changes, self.show_store_changes)
+
+    # Catch up with the task store on the worker thread and return True when the tasks changed
+    def check_for_changes(self):
+        try:
+            return self.task_manager.refresh_if_changed()
+        except OSError as e:
+            print(f"Could not check for changes: {e}")
+            return False
+
+    # Show the outcome of a change check on the Tk thread and schedule the next check
+    def show_store_changes(self, changed):
+        if changed:
+            self.apply_filter()
+        self.refresh_next_tasks()
+        self.root.after(CHANGE_POLL_MS, self.watch_for_changes)
+
+    # Look up the most urgent tasks again if the tasks or the day changed since the last time
+    def refresh_next_tasks(self):
+        today = date.today()
+        query = (self.task_manager.version, today)
+        if query == self.next_tasks_query:
+            return
+        self.next_tasks_query = query
+        self.next_tasks_worker.submit(lambda: self.task_manager.get_next_tasks(NEXT_TASK_COUNT, today),
+                                      self.show_next_tasks)
+
+    # List the most urgent tasks in the "Next up" panel
+    def show_next_tasks(self, tasks):
+        self.next_tasks_list.delete(0, tk.END)
+        for task in tasks:
+            self.next_tasks_list.insert(tk.END, f"{task.name}  ({task.priority}, due {task.due_date})")
+
+    # Show a short message next to the filter controls
+    def set_status(self, text):
+        self.status_label.config(text=text)
 
     # Set up column headers and their sort commands
     def setup_sort_buttons(self):
@@ -96,6 +2274,17 @@ class TaskManagerGUI:
         self.tree.heading("priority", text="Priority", command=self.sort_by_priority)
         self.tree.heading("due_date", text="Due Date", command=self.sort_by_date)
 
+    # Reset the bookkeeping used to render the table
+    def init_table_state(self):
+        self.rows = []  # Tasks the table is showing, in display order
+        self.first_row = 0  # Index in self.rows of the top row in the viewport
+        self.shown_rows = {}  # Treeview item id -> values currently displayed
+        self.render_job = None  # Pending root.after id of a chunked render
+        self.filter_job = None  # Pending root.after id of a debounced filter
+        self.last_render_ms = 0.0  # Duration of the slowest step of the last render
+        self.showing_all = True  # Whether self.rows is the whole task list in insertion order
+        self.shown_query = None  # (task version, filters, sort) of the last query, to skip repeating it
+
     # Create and arrange all GUI components
     def setup_gui(self):
         # Create filter controls frame
@@ -117,50 +2306,319 @@ class TaskManagerGUI:
         self.due_date_filter = tk.Entry(frame)
         self.due_date_filter.grid(row=0, column=5)
 
-        # Filter button
+        # Due date range filter components
+        tk.Label(frame, text="Due From:").grid(row=1, column=0)
+        self.due_from_filter = tk.Entry(frame)
+        self.due_from_filter.grid(row=1, column=1)
+        tk.Label(frame, text="Due To:").grid(row=1, column=2)
+        self.due_to_filter = tk.Entry(frame)
+        self.due_to_filter.grid(row=1, column=3)
+        tk.Label(frame, text="When:").grid(row=1, column=4)
+        self.relative_due_filter = ttk.Combobox(frame, values=[""] + list(RELATIVE_DUE_RANGES), state="readonly")
+        self.relative_due_filter.grid(row=1, column=5)
+
+        # Filter button (the filters also apply as you type)
         tk.Button(frame, text="Filter", command=self.apply_filter).grid(row=0, column=6, padx=5)
+        for entry in (self.name_filter, self.due_date_filter, self.due_from_filter, self.due_to_filter):
+            entry.bind("<KeyRelease>", self.schedule_filter)
+        for combobox in (self.priority_filter, self.relative_due_filter):
+            combobox.bind("<<ComboboxSelected>>", self.schedule_filter)
+
+        # Shows "Searching…" while a query runs and progress while tasks load
+        self.status_label = tk.Label(frame, text="", width=20, anchor=tk.W)
+        self.status_label.grid(row=0, column=7, padx=5)
 
-        # Treeview for displaying tasks
-        self.tree = ttk.Treeview(self.root, columns=("name", "description", "priority", "due_date"), show='headings')
+        # "Next up" panel listing the most urgent tasks, refreshed on a worker thread of its own
+        next_frame = tk.Frame(self.root)
+        next_frame.pack(fill=tk.X, padx=10)
+        tk.Label(next_frame, text="Next up:").pack(side=tk.LEFT, anchor=tk.N)
+        self.next_tasks_list = tk.Listbox(next_frame, height=NEXT_TASK_COUNT)
+        self.next_tasks_list.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.next_tasks_worker = QueryWorker(self.root)
+        self.next_tasks_query = None  # (task version, day) the panel was last refreshed for
+
+        # Treeview for displaying tasks, with a scrollbar that also drives the virtual mode
+        table_frame = tk.Frame(self.root)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(table_frame, columns=("name", "description", "priority", "due_date"),
+                                 show='headings', height=VISIBLE_ROWS, yscrollcommand=self.on_tree_scrolled)
         for col in ("name", "description", "priority", "due_date"):
             self.tree.column(col, width=150)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for event in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(event, self.on_mouse_wheel)
 
     # Display tasks in the table
     def populate_tree(self, tasks=None):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        self.showing_all = tasks is None
         if tasks is None:
             tasks = self.task_manager.tasks
-        for task in tasks:
-            self.tree.insert('', 'end', values=(task.name, task.description, task.priority, task.due_date))
+        self.rows = tasks
+        self.first_row = 0
+        self.render_rows()
+
+    # Check whether the table only materializes the rows around the viewport
+    def is_virtual(self):
+        return len(self.rows) > VIRTUAL_THRESHOLD
+
+    # Bring the Treeview in line with self.rows
+    @instrumented('render')
+    def render_rows(self):
+        if self.render_job is not None:
+            self.root.after_cancel(self.render_job)
+            self.render_job = None
+        self.last_render_ms = 0.0
+        if self.is_virtual():
+            start = max(0, self.first_row - ROW_BUFFER)
+            window = self.rows[start:self.first_row + VISIBLE_ROWS + ROW_BUFFER]
+            self.run_render_step(self.iter_tree_sync(window), chunked=False)
+            if window:
+                self.tree.yview_moveto((self.first_row - start) / len(window))
+            self.update_virtual_scrollbar()
+        else:
+            self.run_render_step(self.iter_tree_sync(self.rows), chunked=True)
+
+    # Run one chunk of a render (or all of it) and schedule the next chunk with root.after
+    def run_render_step(self, steps, chunked):
+        self.render_job = None
+        start_time = time.perf_counter()
+        finished = True
+        for _ in steps:
+            if chunked:
+                finished = False
+                break
+        step_ms = (time.perf_counter() - start_time) * 1000
+        self.last_render_ms = max(self.last_render_ms, step_ms)
+        if METRICS.enabled:
+            METRICS.record('render_step', step_ms)
+        if not finished:
+            self.render_job = self.root.after(1, self.run_render_step, steps, chunked)
+
+    # Make the table show exactly the given tasks, only inserting, moving, updating or
+    # removing the rows that changed; yields every RENDER_CHUNK_SIZE rows
+    def iter_tree_sync(self, tasks):
+        wanted_ids = [str(task.seq) for task in tasks]
+        wanted = set(wanted_ids)
+        stale = [item for item in self.tree.get_children() if item not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for item in stale:
+                del self.shown_rows[item]
+        order = list(self.tree.get_children())  # Mirror of the Treeview's row order
+        for index, (item, task) in enumerate(zip(wanted_ids, tasks)):
+            values = (task.name, task.description, task.priority, task.due_date)
+            if item not in self.shown_rows:
+                self.tree.insert('', index, iid=item, values=values)
+                order.insert(index, item)
+            else:
+                if index >= len(order) or order[index] != item:
+                    self.tree.move(item, '', index)
+                    order.remove(item)
+                    order.insert(index, item)
+                if self.shown_rows[item] != values:
+                    self.tree.item(item, values=values)
+            self.shown_rows[item] = values
+            if index % RENDER_CHUNK_SIZE == RENDER_CHUNK_SIZE - 1:
+                yield
+
+    # Show the position of the viewport within all rows on the scrollbar
+    def update_virtual_scrollbar(self):
+        total = len(self.rows)
+        self.scrollbar.set(self.first_row / total, min(1.0, (self.first_row + VISIBLE_ROWS) / total))
+
+    # Forward Treeview scrolling to the scrollbar unless the table is virtual
+    def on_tree_scrolled(self, first, last):
+        if not self.is_virtual():
+            self.scrollbar.set(first, last)
+
+    # Handle scrollbar drags ('moveto', fraction) and clicks ('scroll', count, 'units' or 'pages')
+    def on_scrollbar(self, *args):
+        if not self.is_virtual():
+            self.tree.yview(*args)
+        elif args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            step = VISIBLE_ROWS if args[2] == 'pages' else 1
+            self.scroll_to(self.first_row + int(args[1]) * step)
+
+    # Scroll the virtual table with the mouse wheel
+    def on_mouse_wheel(self, event):
+        if not self.is_virtual():
+            return None  # Let the Treeview scroll itself
+        scroll_up = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self.scroll_to(self.first_row + (-3 if scroll_up else 3))
+        return "break"
+
+    # Move the viewport of the virtual table so it starts at the given row
+    def scroll_to(self, first_row):
+        first_row = max(0, min(first_row, len(self.rows) - VISIBLE_ROWS))
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.render_rows()
+
+    # Re-apply the filters once typing pauses for FILTER_DEBOUNCE_MS
+    def schedule_filter(self, event=None):
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DEBOUNCE_MS, self.apply_filter)
 
     # Apply filters based on user input
     def apply_filter(self):
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+            self.filter_job = None
         name = self.name_filter.get().strip() or None
         priority = self.priority_filter.get() or None
         due_date = self.due_date_filter.get().strip() or None
-        filtered = self.task_manager.get_filtered_tasks(name, priority, due_date)
-        self.populate_tree(filtered)
+        try:
+            due_range = self.get_due_range_filter()
+        except ValueError:
+            self.set_status("Dates must be YYYY-MM-DD")
+            return
+        sort_key, reverse = self.sort_key, self.sort_reverse
+        # The table already shows this query's result for the current version of the tasks
+        query = (self.task_manager.version, name, priority, due_date, due_range, sort_key, reverse)
+        if query == self.shown_query:
+            return
+        self.shown_query = query
+
+        self.run_query(lambda: self.task_manager.get_filtered_tasks(name, priority, due_date, due_range,
+                                                                    sort_key, reverse))
+
+    # Read the due date range from the "When" choice, or else the from/to entries
+    # (returns None when no range is set; raises ValueError for malformed dates)
+    def get_due_range_filter(self):
+        relative = self.relative_due_filter.get()
+        if relative:
+            today = date.today().toordinal()
+            return tuple(None if offset is None else date.fromordinal(today + offset)
+                         for offset in RELATIVE_DUE_RANGES[relative])
+        due_from = self.due_from_filter.get().strip() or None
+        due_to = self.due_to_filter.get().strip() or None
+        if due_from is None and due_to is None:
+            return None
+        due_range = (due_from, due_to)
+        get_ordinal_range(due_range)  # Validate on the Tk thread
+        return due_range
+
+    # Show all tasks sorted by a column (clicking the same column again reverses the order)
+    def sort_by(self, sort_key):
+        self.sort_reverse = sort_key == self.sort_key and not self.sort_reverse
+        self.sort_key = sort_key
+        reverse = self.sort_reverse
+        self.shown_query = None  # Sorting shows all tasks, whatever the filters say
+        self.run_query(lambda: self.task_manager.sort_tasks(sort_key, reverse))
+
+    # Run a query on the worker thread and show its result in the table when it's done
+    def run_query(self, query):
+        self.set_status("Searching…")
+        self.query_started = time.perf_counter()
+
+        def run_and_count():
+            tasks = query()
+            len(tasks)  # A lazy SQLite result counts its rows once, here rather than on the Tk thread
+            return tasks
+
+        self.query_worker.submit(run_and_count, self.show_query_result)
+
+    # Display a finished query's result
+    def show_query_result(self, tasks):
+        self.set_status("")
+        self.populate_tree(tasks)
+        if METRICS.enabled:
+            METRICS.record('gui_query', (time.perf_counter() - self.query_started) * 1000)
+
+    # Write the metrics snapshot (bound to F9 when the GUI runs with --metrics)
+    def dump_metrics(self, metrics_file):
+        METRICS.dump(metrics_file)
+        self.set_status(f"Metrics written to {os.path.basename(metrics_file)}")
 
     # Sort tasks by name
     def sort_by_name(self):
-        self.task_manager.sort_tasks('name')
-        self.populate_tree()
+        self.sort_by('name')
 
     # Sort tasks by priority
     def sort_by_priority(self):
-        self.task_manager.sort_tasks('priority')
-        self.populate_tree()
+        self.sort_by('priority')
 
     # Sort tasks by due date
     def sort_by_date(self):
-        self.task_manager.sort_tasks('due_date')
-        self.populate_tree()
+        self.sort_by('due_date')
+
+
+# Print when the window became interactive, showed its first rows and finished loading
+# (as epoch seconds, so a launcher can subtract its own start time), then close it
+def report_startup(root, app, report=None):
+    now = time.time()
+    if report is None:
+        report = {}
+        root.after_idle(lambda: report.setdefault("interactive", time.time()))
+    if "first_rows" not in report and (app.task_manager.tasks or not app.loading):
+        report["first_rows"] = now
+    if not app.loading and "interactive" in report:
+        report["loaded"] = now
+        print(json.dumps(report))
+        root.destroy()
+        return
+    root.after(STARTUP_POLL_MS, report_startup, root, app, report)
 
 
 # Main program entry point
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == ["convert"]:
+    # python "Stage 4.py" convert SOURCE TARGET  (each .json, .txt or .snap)
+    convert_task_file(sys.argv[2], sys.argv[3])
+elif __name__ == "__main__" and sys.argv[1:2] == ["migrate"]:
+    # python "Stage 4.py" migrate SOURCE.json|SOURCE.txt TARGET.db
+    migrate_to_sqlite(sys.argv[2], sys.argv[3])
+elif __name__ == "__main__" and sys.argv[1:2] == ["export-changes"]:
+    # python "Stage 4.py" export-changes STORE.json|STORE.db OUTPUT.jsonl|OUTPUT.csv [SINCE]
+    # (prints the number to pass as SINCE next time; only a .db store keeps numbers between runs)
+    store, target = sys.argv[2], sys.argv[3]
+    manager = SqliteTaskManager(store) if store.endswith(".db") else TaskManager(store)
+    if not store.endswith(".db"):
+        # A .json store is numbered afresh on every load, so any SINCE is from an earlier run
+        # and gets a reset with every task
+        manager.delta_floor = manager.change_seq + 1
+    with open(target, 'w', newline='') as file:
+        last = manager.export_changes(file, int(sys.argv[4]) if len(sys.argv) > 4 else 0,
+                                      "jsonl" if target.endswith((".jsonl", ".ndjson")) else "csv")
+    print(f"Exported changes up to {last}.")
+elif __name__ == "__main__" and sys.argv[1:2] == ["metrics"]:
+    # python "Stage 4.py" metrics TASKS.json OUTPUT.json  (times a load, every filter and sort, and a save)
+    METRICS.enable()
+    manager = TaskManager(sys.argv[2])
+    for priority in PRIORITY_RANKS:
+        manager.get_filtered_tasks(None, priority)
+    for sort_key in SORT_KEY_ATTRIBUTES:
+        manager.sort_tasks(sort_key)
+    manager.save_tasks_to_json(os.devnull)
+    METRICS.dump(sys.argv[3])
+elif __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Task manager GUI.")
+    parser.add_argument("--db", help="open a SQLite store instead of tasks.json")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="start from a binary snapshot cache of tasks.json when it is up to date")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print startup timings as JSON and exit once tasks are loaded")
+    parser.add_argument("--metrics", metavar="FILE", help="record metrics, written to FILE on F9 and on exit")
+    parser.add_argument("--profile", metavar="OPERATION", action="append", default=[],
+                        help="print a cProfile report for every call of an operation (load, filter, sort, render, save)")
+    args = parser.parse_args()
+    if args.metrics or args.profile:
+        METRICS.enable()
+    for operation in args.profile:
+        METRICS.attach_profiler(operation)
+    import_tkinter()
     root = tk.Tk()  # Create main window
-    app = TaskManagerGUI(root)  # Initialize application
+    manager = SqliteTaskManager(args.db) if args.db else None
+    app = TaskManagerGUI(root, manager, args.fast_start)  # Initialize application
+    if args.startup_report:
+        report_startup(root, app)
+    if args.metrics:
+        root.bind("<F9>", lambda event: app.dump_metrics(args.metrics))
     root.mainloop()  # Start the GUI event loop
+    if args.metrics:
+        METRICS.dump(args.metrics)
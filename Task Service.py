@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from task_dates import normalize_date
+
+
+# Load Stage 4 for its TaskManager (the file name contains a space, so it can't be imported directly)
+def load_stage(file_name, module_name):
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+stage4 = load_stage("Stage 4.py", "stage4")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+WRITE_BATCH_SIZE = 256  # Most mutations applied (and fsynced) together
+COMPACT_RECORDS = 10000  # Journal records written before the service rewrites tasks.json
+MAX_BODY_BYTES = 1 << 20
+HTTP_REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+# An error reported to the client with an HTTP status
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Serves a TaskManager over HTTP/JSON. Mutations go through one writer coroutine that applies
+# them in batches with a single journal write and fsync per batch, and only after that shows
+# them to reads. Reads run on worker threads and answer from one version of the tasks (the
+# manager's version number is in each listing), and identical reads arriving at the same
+# version while one is in flight share its result.
+class TaskService:
+    def __init__(self, task_manager):
+        self.task_manager = task_manager
+        self.writes = asyncio.Queue()
+        self.pending_reads = {}  # (path, query, version) -> future of the response
+        self.journaled_records = 0
+        self.committed = task_manager.get_version()  # (version, tasks) after the last batch, for /stats
+
+    # Start the writer coroutine (call from inside the running event loop)
+    def start(self):
+        self.writer = asyncio.get_running_loop().create_task(self.run_writer())
+
+    # Handle one client connection, serving requests until it closes (keep-alive)
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except ServiceError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"Internal error: {e}"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(format_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ServiceError as e:  # Malformed request: answer once and drop the connection
+            writer.write(format_response(e.status, {"error": str(e)}, False))
+        finally:
+            writer.close()
+
+    # Route a request to its handler and return (status, JSON-ready payload)
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        if parts == ["tasks"]:
+            if method == "GET":
+                return 200, await self.read(url.path, url.query, self.list_tasks, parse_qs(url.query))
+            if method == "POST":
+                return 201, await self.write("add", parse_json(body))
+        elif len(parts) == 2 and parts[0] == "tasks":
+            if method == "GET":
+                return 200, await self.read(url.path, "", self.get_task, parts[1])
+            if method in ("PUT", "PATCH"):
+                return 200, await self.write("update", dict(parse_json(body), name=parts[1]))
+            if method == "DELETE":
+                return 204, await self.write("delete", {"name": parts[1]})
+        elif parts == ["next"] and method == "GET":
+            return 200, await self.read(url.path, url.query, self.next_tasks, parse_qs(url.query))
+        elif parts == ["stats"] and method == "GET":
+            version, tasks = self.committed  # Never waits for the manager's lock on the event loop
+            return 200, {"version": version, "tasks": len(tasks),
+                         "queued_writes": self.writes.qsize()}
+        else:
+            raise ServiceError(404, "No such endpoint")
+        raise ServiceError(405, f"{method} is not supported here")
+
+    # Run a read on a worker thread, sharing the result with identical reads already in flight
+    async def read(self, path, query, handler, *args):
+        key = (path, query, self.task_manager.version)
+        future = self.pending_reads.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, handler, *args)
+            self.pending_reads[key] = future
+            future.add_done_callback(lambda _: self.pending_reads.pop(key, None))
+        return await future
+
+    # Queue a mutation for the writer and wait for its outcome
+    async def write(self, op, payload):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((op, payload, future))
+        return await future
+
+    # The single writer: take every queued mutation (up to WRITE_BATCH_SIZE), apply them on a
+    # worker thread with one journal write, then answer each request
+    async def run_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.writes.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+            try:
+                outcomes = await loop.run_in_executor(None, self.apply_batch, batch)
+            except Exception as e:
+                outcomes = [ServiceError(500, f"Could not save changes: {e}")] * len(batch)
+            for (_, _, future), outcome in zip(batch, outcomes):
+                if future.cancelled():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    # Apply a batch of mutations under the exclusive store lock and journal them together. The
+    # mutations are first worked out as journal records without changing the manager, so one
+    # that fails (for any reason) or a failed journal write leaves nothing to undo. The manager's
+    # lock is only taken to apply the saved records, not during the fsync or a compaction.
+    def apply_batch(self, batch):
+        manager = self.task_manager
+        outcomes = []
+        records = []
+        with manager.lock_store():
+            manager.refresh_if_changed()  # Include changes other processes saved
+            changed = {}  # lowercased name -> the task as the batch leaves it (None once deleted)
+            for op, payload, _ in batch:
+                try:
+                    record, outcome = self.plan_mutation(op, payload, changed)
+                except ServiceError as e:
+                    outcomes.append(e)
+                    continue
+                except Exception as e:
+                    outcomes.append(ServiceError(500, f"Internal error: {e}"))
+                    continue
+                records.append(record)
+                outcomes.append(outcome)
+            if records:
+                manager.append_journal_records(records)
+                try:
+                    with manager.lock:
+                        for record in records:
+                            manager.apply_journal_record(record)
+                except Exception:
+                    manager.read_tasks_from_json()  # The records are saved, so reading the store back includes them
+                self.journaled_records += len(records)
+                if self.journaled_records >= COMPACT_RECORDS:
+                    try:
+                        manager.save_tasks_to_json()
+                        self.journaled_records = 0
+                    except OSError as e:  # The batch is already in the journal; try again after the next one
+                        print(f"Could not compact the journal: {e}")
+            self.committed = manager.get_version()
+        return outcomes
+
+    # Work out one mutation against the manager's tasks and the batch's earlier changes, and
+    # return its journal record and the response payload. Only the writer changes the manager,
+    # so its tasks can be looked up here without the manager's lock.
+    def plan_mutation(self, op, payload, changed):
+        if not isinstance(payload, dict) or not isinstance(payload.get("name"), str):
+            raise ServiceError(400, "A task name is required")
+        name = payload["name"].strip()
+        key = name.lower()
+        task = changed[key] if key in changed else self.task_manager.find_task(name)
+        if op == "add":
+            fields = validate_fields(payload, required=True)
+            if not name:
+                raise ServiceError(400, "Task name cannot be empty")
+            if task is not None:
+                raise ServiceError(409, "Task already exists")
+            task = stage4.Task(name, fields["description"], fields["priority"], fields["due_date"])
+        elif task is None or task.name != name:
+            raise ServiceError(404, "Task not found")
+        elif op == "delete":
+            changed[key] = None
+            return {"op": "delete", "name": task.name}, None
+        else:
+            fields = validate_fields(payload, required=False)
+            task = stage4.Task(task.name, fields.get("description", task.description),
+                               fields.get("priority", task.priority), fields.get("due_date", task.due_date))
+        changed[key] = task
+        return {"op": op, "task": task.to_dict()}, task.to_dict()
+
+    # List tasks with optional filters (name, priority, due_date, due_from, due_to), an optional
+    # sort (sort=name|priority|due_date, reverse=1), and offset/limit or cursor paging (pass a
+    # page's next_cursor back as cursor=... to get the page after it, even while tasks change)
+    def list_tasks(self, query):
+        def param(key, default=None):
+            return query.get(key, [default])[-1]
+
+        sort_key = param("sort")
+        if sort_key is not None and sort_key not in stage4.SORT_KEY_ATTRIBUTES:
+            raise ServiceError(400, "sort must be name, priority or due_date")
+        try:
+            offset = max(0, int(param("offset", 0)))
+            limit = min(MAX_PAGE_SIZE, max(0, int(param("limit", DEFAULT_PAGE_SIZE))))
+        except ValueError:
+            raise ServiceError(400, "offset and limit must be integers")
+        reverse = param("reverse", "0") in ("1", "true")
+        cursor = param("cursor")
+        if cursor is not None:
+            # The next_cursor of an earlier page, sent back as JSON
+            try:
+                cursor = json.loads(cursor)
+            except ValueError:
+                cursor = None
+            if not isinstance(cursor, list) or not cursor:
+                raise ServiceError(400, "cursor must be the next_cursor of an earlier page")
+        due_from, due_to = param("due_from"), param("due_to")
+        due_range = (due_from, due_to) if due_from or due_to else None
+        manager = self.task_manager
+        with manager.lock:
+            version = manager.version
+            try:
+                page = manager.get_task_page(param("name"), param("priority"), param("due_date"), due_range,
+                                             sort_key, reverse, limit, offset, cursor)
+            except TypeError:
+                raise ServiceError(400, "cursor must be the next_cursor of an earlier page")  # Values of the wrong type
+            except ValueError as e:
+                raise ServiceError(400, str(e))
+        # Tasks are replaced rather than changed, so the page can be serialized outside the lock
+        return {"version": version, "total": page.total, "offset": offset, "limit": limit,
+                "next_cursor": page.next_cursor, "tasks": [task.to_dict() for task in page.tasks]}
+
+    # List the most urgent tasks by priority and days until due (limit=N, 5 by default)
+    def next_tasks(self, query):
+        try:
+            limit = min(MAX_PAGE_SIZE, max(0, int(query.get("limit", [stage4.NEXT_TASK_COUNT])[-1])))
+        except ValueError:
+            raise ServiceError(400, "limit must be an integer")
+        manager = self.task_manager
+        with manager.lock:
+            version = manager.version
+            tasks = manager.get_next_tasks(limit)
+        return {"version": version, "tasks": [task.to_dict() for task in tasks]}
+
+    # Get one task by name (a single lookup, and tasks are replaced rather than changed, so no lock is needed)
+    def get_task(self, name):
+        task = self.task_manager.find_task(name)
+        if task is None or task.name != name:
+            raise ServiceError(404, "Task not found")
+        return task.to_dict()
+
+
+# Check the task fields in a request body (all of them when adding) and return the ones given
+def validate_fields(payload, required):
+    fields = {}
+    for key in ("description", "priority", "due_date"):
+        value = payload.get(key)
+        if value is None:
+            if required and key != "description":
+                raise ServiceError(400, f"{key} is required")
+            continue
+        if not isinstance(value, str):
+            raise ServiceError(400, f"{key} must be a string")
+        fields[key] = value.strip()
+    if "priority" in fields:
+        fields["priority"] = fields["priority"].capitalize()
+        if fields["priority"] not in stage4.PRIORITY_RANKS:
+            raise ServiceError(400, "priority must be High, Medium or Low")
+    if "due_date" in fields:
+        fields["due_date"] = normalize_date(fields["due_date"])
+        if fields["due_date"] is None:
+            raise ServiceError(400, "due_date must be YYYY-MM-DD")
+    if required:
+        fields.setdefault("description", "")
+    return fields
+
+
+# Decode a JSON request body, which must hold an object
+def parse_json(body):
+    try:
+        payload = json.loads(body or b"null")
+    except ValueError:
+        raise ServiceError(400, "The request body must be JSON")
+    if not isinstance(payload, dict):
+        raise ServiceError(400, "The request body must be a JSON object")
+    return payload
+
+
+# Read one HTTP/1.1 request and return (method, target, headers, body), or None at end of stream
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ServiceError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise ServiceError(400, "Malformed Content-Length header")
+    if length > MAX_BODY_BYTES:
+        raise ServiceError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+# Encode a JSON response
+def format_response(status, payload, keep_alive=True):
+    body = b"" if status == 204 else json.dumps(payload, separators=(",", ":")).encode()
+    head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+# Load the store and serve it on a TCP port or a Unix socket until interrupted
+async def serve(json_file, host, port, unix_socket=None):
+    service = TaskService(stage4.TaskManager(json_file))
+    service.start()
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle_connection, path=unix_socket)
+        print(f"Serving {json_file} on {unix_socket}", flush=True)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+        port = server.sockets[0].getsockname()[1]
+        print(f"Serving {json_file} on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a task store over HTTP/JSON.")
+    parser.add_argument("--tasks", default="tasks.json", help="task file to serve (default: tasks.json)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (0 picks a free one)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.tasks, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        sys.exit(0)
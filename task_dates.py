@@ -0,0 +1,49 @@
+from datetime import date, datetime
+from functools import lru_cache
+
+# Due dates shared by every stage: validation, normalization to YYYY-MM-DD and day ordinals.
+# The stage scripts import this module from their own folder.
+DATE_FORMAT = "%Y-%m-%d"
+DATE_CACHE_SIZE = 1 << 16  # Distinct strings (and ordinals) remembered, about 180 years of days
+
+# Day ordinal given to unparseable due dates so they sort after every real date
+INVALID_DATE_ORDINAL = date.max.toordinal() + 1
+
+
+# Parse a YYYY-MM-DD string into a day ordinal (INVALID_DATE_ORDINAL when it isn't a real date)
+def get_date_ordinal(due_date):
+    if type(due_date) is not str:  # None or another JSON value, which also keeps unhashable values out of the cache
+        return INVALID_DATE_ORDINAL
+    return parse_date_ordinal(due_date)
+
+
+# The cached body of get_date_ordinal. Zero-padded dates take the date.fromisoformat fast path;
+# anything else goes to strptime, so looser forms it accepts (such as 2024-1-5) still count.
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_ordinal(text):
+    if len(text) == 10 and text[4] == "-" and text[7] == "-" and text.isascii():
+        try:
+            return date.fromisoformat(text).toordinal()
+        except ValueError:
+            pass
+    try:
+        return datetime.strptime(text, DATE_FORMAT).toordinal()
+    except ValueError:
+        return INVALID_DATE_ORDINAL
+
+
+# Format a day ordinal as YYYY-MM-DD
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_date_ordinal(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+# Check that a due date is a real date in YYYY-MM-DD format
+def is_valid_date(due_date):
+    return get_date_ordinal(due_date) != INVALID_DATE_ORDINAL
+
+
+# Get the zero-padded YYYY-MM-DD form of a due date, or None when it isn't a real date
+def normalize_date(due_date):
+    ordinal = get_date_ordinal(due_date)
+    return None if ordinal == INVALID_DATE_ORDINAL else format_date_ordinal(ordinal)
@@ -0,0 +1,72 @@
+import csv
+
+# tasks.txt records shared by Stage 2 and Stage 4: one task per record as name, description,
+# priority and due date, written with the csv module so fields holding commas, quotes or line
+# breaks are quoted. Lines written before quoting are still read the way they were written.
+# The stage scripts import this module from their own folder.
+TASK_FIELD_COUNT = 4
+
+
+# Write rows of task fields, quoting only the fields that need it
+def write_task_rows(file, rows):
+    csv.writer(file, lineterminator="\n").writerows(rows)
+
+
+# Make a csv reader over lines of tasks.txt. It is strict, so a quote in the middle of a field
+# is an error (and the line is read the old way) instead of being silently dropped.
+def make_task_reader(lines):
+    return csv.reader(lines, strict=True)
+
+
+# Yield lines, appending each one to record_lines (which the caller clears before every record)
+def remember_lines(lines, record_lines):
+    for line in lines:
+        record_lines.append(line)
+        yield line
+
+
+# Read the next record from a task reader whose lines are remembered in record_lines.
+# Returns the rows it holds (usually one), or None at the end. Skipped lines are counted
+# by reason in errors.
+def read_task_record(reader, record_lines, errors):
+    record_lines.clear()
+    try:
+        row = next(reader)
+    except StopIteration:
+        return None
+    except csv.Error:
+        row = None  # A stray or unclosed quote, or a quoted field past csv.field_size_limit()
+    if row is not None and len(row) == TASK_FIELD_COUNT:
+        return [row]
+    if row is None or len(record_lines) > 1:
+        # Read the lines again one by one the way the old comma-only format was read. A
+        # quote that was never closed swallowed the lines after it, which counts as an error.
+        if len(record_lines) > 1:
+            errors["an unclosed quote"] += 1
+        rows = []
+        for line in record_lines:
+            parts = line.strip().split(",")
+            if len(parts) == TASK_FIELD_COUNT:
+                rows.append(parts)
+            elif line.strip():
+                errors["missing or extra information"] += 1
+        return rows
+    if row:  # Blank lines are skipped quietly
+        errors["missing or extra information"] += 1
+    return []
+
+
+# Yield the rows of every record in lines of tasks.txt, counting skipped lines in errors
+def iter_task_rows(lines, errors):
+    record_lines = []
+    reader = make_task_reader(remember_lines(lines, record_lines))
+    while (rows := read_task_record(reader, record_lines, errors)) is not None:
+        yield from rows
+
+
+# Describe the lines skipped while reading, by reason (None when nothing was skipped)
+def describe_skipped_lines(errors):
+    if not errors:
+        return None
+    details = ", ".join(f"{count} with {reason}" for reason, count in errors.most_common())
+    return f"Skipped {sum(errors.values())} line(s): {details}."